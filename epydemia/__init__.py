@@ -4,8 +4,19 @@ from .basedesim import *
 from .abstractcls import *
 from .parameters import *
 from .utils import *
+from .bundle import *
 from .simevents import *
+from .records import *
+from .storage import *
+from .sinks import *
 from .simobjects import *
+from .sharedmem import *
+from .checkpoint import *
 from .simulator import *
 from .plot import *
-
+from .replications import *
+from .batched import *
+from .sweep import *
+from .calibration import *
+from .emulator import *
+from .results import *
@@ -129,6 +129,21 @@ class AbstractDisease(SubsObject, ABC):
         self['infection_prob'] = infection_prob
         self['states'] = {state: i for i, state in enumerate(states)}
 
+    def is_quiescent(self) -> bool:
+        """ Method used to check whether no agent is in an infectious state,
+        so the disease cannot spread. Infectious states are given by the
+        'infectious_states' attribute (list of state labels). If it is not
+        defined, the disease is never considered quiescent.
+
+        Returns:
+            bool: whether no agent is infectious.
+        """
+        if 'infectious_states' not in self.attributes.keys():
+            return False
+        states = [self['states'][state] for state in
+                  self['infectious_states']]
+        return not np.isin(self.population[self.label], states).any()
+
     @abstractmethod
     def infect(self):
         """ Method used to trigger the progression of the disease on a subset
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 import numpy as np
+import itertools
+import zlib
 from typing import Any, Union, Self, Callable, List
 
 
@@ -50,12 +52,16 @@ class Simulator(ABC):
         """
         self.events = Scheduler()
         self.sim_time = 0
+        self.stop_conditions = []
+        self.stopped = False
+        self.quiescence = None
 
     def run(self, stop_time: Union[float, int] = float('inf')):
         """ Main method used to run a simulation. It is used to execute all
         events until:
-        i) a specified stopping time or
-        ii) all events have been executed.
+        i) a specified stopping time,
+        ii) all events have been executed, or
+        iii) a stop condition is met.
         The current simulation time is updated upon execution of events.
 
         Args:
@@ -63,14 +69,144 @@ class Simulator(ABC):
                                          Defaults to float('inf').
         """
         self.sim_time = 0
+        self.stopped = False
+        self.advance(stop_time)
+        self.events.clear()
+
+    def add_stop_condition(self, condition: Callable):
+        """ Method used to add a condition to stop the simulation early.
+        Conditions are checked after the execution of each event, and the
+        simulation stops as soon as one of them is met (see the stopped
+        attribute).
+
+        Args:
+            condition (callable function): callable function that accepts
+                                           the simulator as argument. Must
+                                           return a boolean.
+        """
+        try:
+            assert(callable(condition))
+        except AssertionError:
+            raise ValueError('Condition must be a callable function.')
+        self.stop_conditions.append(condition)
+
+    def advance(self, stop_time: Union[float, int], inclusive: bool = True):
+        """ Method used to execute events until a specified time, without
+        resetting the simulation time nor clearing the remaining events.
+        It allows to pause a simulation and resume it later.
+
+        Args:
+            stop_time (float): simulation time until which events are
+                               executed.
+            inclusive (bool, optional): whether events scheduled exactly at
+                                        stop_time are executed.
+                                        Defaults to True.
+        """
         while (self.events.size() > 0):
-            self.sim_time = self.events.next_event().time
-            if self.sim_time <= stop_time:
-                self.events.do_next()
+            next_time = self.events.next_event().time
+            if next_time < stop_time or (inclusive and
+                                         next_time == stop_time):
+                if self.quiescence is not None and \
+                        self.is_skippable(self.events.next_event()) and \
+                        self.is_quiescent() and \
+                        self.skip_idle(stop_time, inclusive):
+                    if self.stopped:
+                        break
+                else:
+                    self.sim_time = next_time
+                    self.execute_next()
+                if any(condition(self) for condition in
+                       self.stop_conditions):
+                    self.stopped = True
+                    break
             else:
                 self.sim_time = stop_time
                 break
-        self.events.clear()
+
+    def execute_next(self):
+        """ Method used to execute the next event. It can be overridden to
+        run operations around the execution of events.
+        """
+        self.events.do_next()
+
+    def is_quiescent(self) -> bool:
+        """ Method used to check whether the system is quiescent, that is,
+        whether skippable events would not change it. Must be overridden
+        to use the quiescence attribute.
+
+        Returns:
+            bool: whether the system is quiescent. Defaults to False.
+        """
+        return False
+
+    def is_skippable(self, event: 'Event') -> bool:
+        """ Method used to check whether an event can be skipped while the
+        system is quiescent.
+
+        Args:
+            event (Event.object): event to check.
+
+        Returns:
+            bool: whether the event can be skipped. Defaults to False.
+        """
+        return False
+
+    def skip_events(self, events: List['Event']):
+        """ Method called with the events skipped while the system is
+        quiescent, which can be overridden to account for them (i.e. to
+        fill the statistics they would have collected).
+
+        Args:
+            events (list): skipped events.
+        """
+        pass
+
+    def skip_idle(self, stop_time: Union[float, int],
+                  inclusive: bool = True) -> bool:
+        """ Method called by advance when the system is quiescent and the
+        next event is skippable. Depending on the quiescence attribute:
+        - 'stop': the simulation stops (see the stopped attribute) if no
+                  pending event until stop_time can create infections
+                  (see Event.creates_infections).
+        - 'fast_forward': skippable events are removed until the next
+                          event that is not skippable, and handed to
+                          skip_events.
+
+        Args:
+            stop_time (float): simulation time until which events are
+                               executed.
+            inclusive (bool, optional): whether events scheduled exactly at
+                                        stop_time are executed.
+                                        Defaults to True.
+
+        Returns:
+            bool: whether the simulation stopped or events were skipped.
+        """
+        events = self.events.events_list
+
+        def in_horizon(event):
+            return event.time < stop_time or (inclusive and
+                                              event.time == stop_time)
+
+        if self.quiescence == 'stop':
+            for event in events:
+                if not in_horizon(event):
+                    break
+                if event.creates_infections:
+                    return False
+            self.stopped = True
+            return True
+        k = 0
+        while k < len(events) and in_horizon(events[k]) and \
+                self.is_skippable(events[k]):
+            k += 1
+        if k == 0:
+            return False
+        skipped = events[:k]
+        del events[:k]
+        self.sim_time = skipped[-1].time
+        self.skip_events(skipped)
+        return True
 
     def now(self) -> float:
         """ Method used to return the current simulation time.
@@ -85,10 +221,17 @@ class Event(ABC):
     """Abstract event class to use in a discrete simulation framework.
     User-defined events must inherit from this class.
 
+    Events that can never lead to new infections (i.e. an agent recovering
+    or a masking intervention) can set the creates_infections class
+    attribute to False, which allows to stop simulations early once an
+    outbreak has died out (see Simulator.skip_idle).
+
     Args:
         ABC (class): implementation of python's abstract class
     """
 
+    creates_infections = True
+
     def __init__(self, time: Union[int, float], simulator: Simulator):
         """Event object initialization. The creation of an event must be
         preceded by the definition of a simulator object, which must be
@@ -172,6 +315,29 @@ class Scheduler:
             i += 1
         self.events_list.insert(i, event)
 
+    def promote(self, event: Event, condition: Callable = None):
+        """ Method used to move a scheduled event ahead of the events
+        scheduled at the same time. If a condition is given, the event is
+        only moved ahead of the events that meet it.
+
+        Args:
+            event (Event.object): event to be moved.
+            condition (callable function, optional): callable function that
+                                                     accepts an event object
+                                                     as argument. Must
+                                                     return a boolean.
+                                                     Defaults to None.
+        """
+        self.events_list.remove(event)
+        i = 0
+        while i < self.size():
+            other = self.events_list[i]
+            if other > event or (other.time == event.time and (
+                    condition is None or condition(other))):
+                break
+            i += 1
+        self.events_list.insert(i, event)
+
     def cancel_event(self, event: Event):
         """ Method used to cancel an event from the scheduler. Object is
         removed from the events list.
@@ -242,18 +408,255 @@ class Stream(np.random.RandomState):
     numpy's RandomState class which is used to sample random numbers from
     several probability distributions.
 
+    Scalar draws (i.e. stream.exponential(3) in an event) have a large
+    overhead per call. Buffered samplers, obtained with the buffered
+    method, draw variates of a distribution in blocks and return them one
+    at a time. Each sampler has its own generator, seeded from the seed of
+    the stream and the distribution and parameters of the sampler, so the
+    values of a sampler only depend on the seed of the stream and on how
+    many values were taken from it, and not on calls to other samplers or
+    to the stream itself. Values differ from the ones given by the
+    unbuffered methods of the stream.
+
     Args:
         np.random.RandomState (class): numpy's random state class.
     """
 
-    def __init__(self, seed: int):
+    def __init__(self, seed: int, generator: bool = False,
+                 block_size: int = 1024):
         """ Stream object must be initialized using a seed.
 
         Args:
             seed (int): pseudo-random generator seed.
+            generator (bool, optional): whether buffered samplers use numpy's
+                                        Generator with the PCG64 bit
+                                        generator, which is faster, instead
+                                        of a RandomState with MT19937.
+                                        Defaults to False.
+            block_size (int, optional): number of variates drawn at once by
+                                        buffered samplers. Defaults to 1024.
         """
         super().__init__(seed=seed)
         self.random_seed = seed
+        self.generator = generator
+        self.block_size = block_size
+        self.samplers = {}
+
+    def buffered(self, distribution: str, *params: Any) -> 'BufferedSampler':
+        """ Method used to get the buffered sampler of a distribution with
+        given parameters. Samplers are created once and reused.
+
+        Args:
+            distribution (str): name of the sampling method (i.e.
+                                'exponential', 'gamma' or 'random').
+            params: parameters of the distribution.
+
+        Returns:
+            BufferedSampler: sampler returning a variate when called.
+        """
+        key = (distribution,) + params
+        try:
+            return self.samplers[key]
+        except KeyError:
+            entropy = zlib.crc32(repr(key).encode())
+            sequence = np.random.SeedSequence([self.random_seed, entropy])
+            if self.generator:
+                source = np.random.Generator(np.random.PCG64(sequence))
+            else:
+                source = np.random.RandomState(np.random.MT19937(sequence))
+            sampler = BufferedSampler(source, distribution, params,
+                                      self.block_size)
+            self.samplers[key] = sampler
+            return sampler
 
     def reset(self):
         self.seed(self.random_seed)
+        self.samplers = {}
+
+    def keyed_random(self, agents: Union[int, np.ndarray],
+                     day: Union[int, float], purpose: str,
+                     draw: int = 0) -> np.ndarray:
+        """ Method used to draw uniform numbers in [0, 1) keyed by agent,
+        day and purpose. Values are computed with the counter-based
+        Philox4x32-10 generator, using the seed of the stream as key and
+        (agent, day, purpose, draw) as counter, so they do not depend on
+        the order of the draws nor on any other draw of the stream. The
+        same agent, day and purpose always give the same value, which
+        keeps draws aligned between scenarios (common random numbers) and
+        makes vectorized or parallel kernels reproduce serial results.
+
+        Args:
+            agents (int or numpy.Array): agents ids.
+            day (float): simulation day. Decimals are discarded.
+            purpose (str): label of the draw (i.e. 'infection'). Different
+                           purposes give independent values.
+            draw (int, optional): index used to get several independent
+                                  values for the same agent, day and
+                                  purpose. Defaults to 0.
+
+        Returns:
+            numpy.Array: uniform numbers, one per agent.
+        """
+        words = self._keyed_words(agents, day, purpose, draw)
+        return self._to_uniform(words[0], words[1])
+
+    def keyed_exponential(self, scale: float,
+                          agents: Union[int, np.ndarray],
+                          day: Union[int, float], purpose: str,
+                          draw: int = 0) -> np.ndarray:
+        """ Method used to draw exponential variates keyed by agent, day and
+        purpose, as in keyed_random.
+
+        Args:
+            scale (float): mean of the distribution.
+            agents (int or numpy.Array): agents ids.
+            day (float): simulation day. Decimals are discarded.
+            purpose (str): label of the draw.
+            draw (int, optional): index of the draw. Defaults to 0.
+
+        Returns:
+            numpy.Array: exponential variates, one per agent.
+        """
+        return -scale*np.log1p(-self.keyed_random(agents, day, purpose,
+                                                   draw))
+
+    def keyed_normal(self, loc: float, scale: float,
+                     agents: Union[int, np.ndarray],
+                     day: Union[int, float], purpose: str,
+                     draw: int = 0) -> np.ndarray:
+        """ Method used to draw normal variates keyed by agent, day and
+        purpose, as in keyed_random, using the Box-Muller transform.
+
+        Args:
+            loc (float): mean of the distribution.
+            scale (float): standard deviation of the distribution.
+            agents (int or numpy.Array): agents ids.
+            day (float): simulation day. Decimals are discarded.
+            purpose (str): label of the draw.
+            draw (int, optional): index of the draw. Defaults to 0.
+
+        Returns:
+            numpy.Array: normal variates, one per agent.
+        """
+        words = self._keyed_words(agents, day, purpose, draw)
+        u = self._to_uniform(words[0], words[1])
+        v = self._to_uniform(words[2], words[3])
+        return loc + scale*np.sqrt(-2*np.log1p(-u))*np.cos(2*np.pi*v)
+
+    def _keyed_words(self, agents: Union[int, np.ndarray],
+                     day: Union[int, float], purpose: str,
+                     draw: int) -> np.ndarray:
+        agents = np.atleast_1d(np.asarray(agents, dtype=np.uint64))
+        counter = np.empty((4, len(agents)), dtype=np.uint64)
+        counter[0] = agents & 0xFFFFFFFF
+        counter[1] = (agents >> np.uint64(32)) ^ \
+            (np.uint64(draw) << np.uint64(16))
+        counter[2] = int(np.floor(day)) & 0xFFFFFFFF
+        counter[3] = zlib.crc32(purpose.encode())
+        seed = int(self.random_seed)
+        return philox4x32(counter, (seed & 0xFFFFFFFF,
+                                    (seed >> 32) & 0xFFFFFFFF))
+
+    @staticmethod
+    def _to_uniform(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        # 53 random bits, as numpy does for doubles
+        return ((a >> np.uint64(5))*67108864.0 +
+                (b >> np.uint64(6)))/9007199254740992.0
+
+    def __reduce__(self):
+        # RandomState pickles as a plain RandomState, which would lose the
+        # class and its attributes (i.e. when copying a simulation)
+        return (type(self), (self.random_seed,),
+                (self.get_state(legacy=False), self.__dict__))
+
+    def __setstate__(self, state: tuple):
+        random_state, attributes = state
+        self.set_state(random_state)
+        self.__dict__.update(attributes)
+
+
+class BufferedSampler:
+    """ Class used to draw variates of a distribution in blocks, and return
+    them one at a time. Samplers are created with Stream.buffered.
+    """
+
+    def __init__(self, source: Union[np.random.Generator,
+                                     np.random.RandomState],
+                 distribution: str, params: tuple, block_size: int):
+        """
+        Args:
+            source (Generator or RandomState): generator of the variates.
+            distribution (str): name of the sampling method.
+            params (tuple): parameters of the distribution.
+            block_size (int): number of variates drawn at once.
+        """
+        try:
+            assert(callable(getattr(source, distribution, None)))
+        except AssertionError:
+            raise ValueError(
+                'Unknown distribution {}.'.format(distribution))
+        self.source = source
+        self.distribution = distribution
+        self.params = params
+        self.block_size = block_size
+        self.values = iter(())
+
+    def __call__(self, size: int = None) -> Union[Any, np.ndarray]:
+        """ Method used to get variates from the buffer, drawing a new block
+        when it is exhausted.
+
+        Args:
+            size (int, optional): number of variates. Defaults to None, which
+                                  returns a single variate.
+
+        Returns:
+            Any: a variate, or an array of variates if size is given.
+        """
+        if size is None:
+            try:
+                return next(self.values)
+            except StopIteration:
+                self._refill()
+                return next(self.values)
+        values = list(itertools.islice(self.values, size))
+        while len(values) < size:
+            self._refill()
+            values.extend(itertools.islice(self.values, size - len(values)))
+        return np.array(values)
+
+    def _refill(self):
+        # Python scalars are faster to index and operate than numpy ones
+        self.values = iter(getattr(self.source, self.distribution)(
+            *self.params, size=self.block_size).tolist())
+
+
+_PHILOX_M = (np.uint64(0xD2511F53), np.uint64(0xCD9E8D57))
+_PHILOX_W = (0x9E3779B9, 0xBB67AE85)
+
+
+def philox4x32(counter: np.ndarray, key: tuple,
+               rounds: int = 10) -> np.ndarray:
+    """ Computes the Philox4x32 counter-based generator (Salmon et al.
+    2011), vectorized over counters.
+
+    Args:
+        counter (numpy.Array): counters of shape (4, n), with 32-bit words
+                               stored as uint64.
+        key (tuple): two 32-bit words.
+        rounds (int, optional): number of rounds. Defaults to 10.
+
+    Returns:
+        numpy.Array: random 32-bit words of shape (4, n), as uint64.
+    """
+    mask, shift = np.uint64(0xFFFFFFFF), np.uint64(32)
+    c0, c1, c2, c3 = (np.asarray(word, dtype=np.uint64) for word in counter)
+    k0, k1 = key
+    for i in range(rounds):
+        if i > 0:
+            k0 = (k0 + _PHILOX_W[0]) & 0xFFFFFFFF
+            k1 = (k1 + _PHILOX_W[1]) & 0xFFFFFFFF
+        p0 = _PHILOX_M[0]*c0
+        p1 = _PHILOX_M[1]*c2
+        c0, c1, c2, c3 = ((p1 >> shift) ^ c1 ^ np.uint64(k0), p1 & mask,
+                          (p0 >> shift) ^ c3 ^ np.uint64(k1), p0 & mask)
+    return np.stack([c0, c1, c2, c3])
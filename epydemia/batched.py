@@ -0,0 +1,277 @@
+from . import Population
+from typing import Any, Callable, Dict, List, Tuple, Union
+import numpy as np
+
+
+class BatchedDisease:
+    """ Class used to describe a compartmental disease for batched
+    simulations. Susceptible agents in contact with infectious agents get
+    infected with a daily probability per contact, moving to the state
+    given by infected_state. Agents then progress through the states
+    defined in progression, where each state is mapped to the next state
+    and a sampler of the time spent in the state.
+
+    Samplers are functions that receive a numpy Generator and a number of
+    agents, and return an array with the time spent in the state by each
+    agent (i.e. lambda rng, n: 0.5 + rng.exponential(10, n)).
+
+    The transmission function computes a factor of the infection
+    probability of each edge from the attributes of its agents (i.e.
+    masking), as compute_transmission_probabilities does for event-driven
+    diseases. It receives the attributes dictionary of the BatchedSim
+    object, whose values have shape (R, N), and the source and target
+    agents of the edges, and returns factors of shape (R, E).
+    """
+
+    def __init__(self, label: str, states: List[str], infection_prob: float,
+                 progression: Dict[str, Tuple[str, Callable]],
+                 susceptible_states: List[str] = ['susceptible'],
+                 infectious_states: List[str] = ['infected'],
+                 infected_state: str = 'exposed',
+                 transmission: Callable[[dict, np.ndarray, np.ndarray],
+                                        np.ndarray] = None):
+        """
+        Args:
+            label (str): disease label.
+            states (list): disease states labels.
+            infection_prob (float): daily probability of infection per
+                                    contact with an infectious agent.
+            progression (dict): next state and time sampler by state.
+            susceptible_states (list, optional): states that can be
+                                                 infected.
+                                                 Defaults to ['susceptible'].
+            infectious_states (list, optional): states that can infect.
+                                                Defaults to ['infected'].
+            infected_state (str, optional): state of newly infected
+                                            agents. Defaults to 'exposed'.
+            transmission (callable, optional): factor of the infection
+                                               probability of each edge
+                                               given agents' attributes.
+                                               Defaults to None (factor 1).
+        """
+        self.label = label
+        self.states = {state: i for i, state in enumerate(states)}
+        self.infection_prob = infection_prob
+        self.progression = {self.states[s]: (self.states[n], sampler)
+                            for s, (n, sampler) in progression.items()}
+        self.susceptible_ids = [self.states[s] for s in susceptible_states]
+        self.infectious_ids = [self.states[s] for s in infectious_states]
+        self.infected_id = self.states[infected_state]
+        self.transmission = transmission
+
+    def state_id(self, state_label: str) -> int:
+        return self.states[state_label]
+
+
+class BatchedSim:
+    """ Class used to run R replications of a daily step model at once.
+    Disease states, attributes and edge transmission probabilities carry
+    a leading replication axis of size R, and each step (infections and
+    progression of the disease) runs as vectorized operations over all
+    replications. This removes the per-event python overhead, which
+    dominates the running time for small populations.
+
+    Each replication has its own random stream (a numpy Generator seeded
+    with the replication's seed), so a replication gives the same results
+    regardless of the other replications in the batch. Random variates
+    are the only per-replication work: each stream draws the variates of
+    its replication in one call, and states and transition times are
+    then updated for all replications at once.
+
+    Interventions are modeled as functions scheduled at a given day,
+    which receive the BatchedSim object and can modify states,
+    attributes or edge probabilities. Interventions that change
+    attributes used by the disease's transmission function (i.e.
+    masking) must call update_transmission_probabilities.
+    """
+
+    def __init__(self, population: Population, disease: BatchedDisease,
+                 seeds: List[int], step_size: Union[int, float] = 1,
+                 layer_labels: List[str] = None):
+        """
+        Args:
+            population (Population): population with network layers. If it
+                                     has a states attribute labeled as the
+                                     disease, it is used as initial states.
+            disease (BatchedDisease): disease to simulate.
+            seeds (list): random seed of each replication.
+            step_size (float, optional): time between steps. Defaults to 1.
+            layer_labels (list, optional): layers used for transmission.
+                                           Defaults to active layers.
+        """
+        self.population = population
+        self.disease = disease
+        self.replications = len(seeds)
+        self.size = population.size
+        self.step_size = step_size
+        self.streams = [np.random.default_rng(seed) for seed in seeds]
+        if layer_labels is None:
+            layer_labels = [layer.label for layer in
+                            population.network.get_active_layers()]
+        edges = [np.array(population.network[label].graph.get_edgelist(),
+                          dtype=np.int64).reshape(-1, 2)
+                 for label in layer_labels]
+        edges = np.concatenate(edges) if edges else \
+            np.empty((0, 2), dtype=np.int64)
+        self.source, self.target = edges[:, 0], edges[:, 1]
+        self.edge_prob = np.full((self.replications, len(edges)),
+                                 disease.infection_prob)
+        if disease.label in population.attributes:
+            initial = np.asarray(population[disease.label], dtype=np.int8)
+        else:
+            initial = np.full(self.size, disease.state_id('susceptible'),
+                              dtype=np.int8)
+        self.states = np.tile(initial, (self.replications, 1))
+        self.next_time = np.full((self.replications, self.size), np.inf)
+        self.attributes = {}
+        self.interventions = []
+        self.sim_time = 0
+        self.history = []
+
+    def add_attribute(self, attribute_label: str, values: Any):
+        """ Method used to add an attribute with a replication axis.
+
+        Args:
+            attribute_label (str): label of the attribute.
+            values (numpy.Array): values of shape (N,), shared by all
+                                  replications, or (R, N).
+        """
+        self.attributes[attribute_label] = np.array(
+            np.broadcast_to(values, (self.replications, self.size)))
+
+    def update_transmission_probabilities(self):
+        """ Method used to recompute the infection probability of each edge
+        in each replication from the attributes of its agents, using the
+        disease's transmission function.
+        """
+        self.edge_prob = np.full((self.replications, len(self.source)),
+                                 self.disease.infection_prob)
+        if self.disease.transmission is not None:
+            self.edge_prob *= self.disease.transmission(
+                self.attributes, self.source, self.target)
+
+    def add_intervention(self, time: Union[int, float],
+                         func: Callable[['BatchedSim'], None]):
+        """ Method used to schedule an intervention, executed before the
+        step at the given time.
+
+        Args:
+            time (float): time of the intervention.
+            func (callable): function receiving the BatchedSim object.
+        """
+        self.interventions.append((time, func))
+        self.interventions.sort(key=lambda item: item[0])
+
+    def import_cases(self, cases: int, state_label: str = 'infected'):
+        """ Method used to move randomly selected susceptible agents of each
+        replication to a given state.
+
+        Args:
+            cases (int): number of cases per replication.
+            state_label (str, optional): state of the cases.
+                                         Defaults to 'infected'.
+        """
+        susceptible = np.isin(self.states, self.disease.susceptible_ids)
+        idx = np.stack([stream.choice(np.flatnonzero(susceptible[r]),
+                                      size=cases, replace=False)
+                        for r, stream in enumerate(self.streams)])
+        rows = np.repeat(np.arange(self.replications), cases)
+        self._enter(rows, idx.ravel(),
+                    self.disease.state_id(state_label), self.sim_time)
+
+    def counts(self) -> np.ndarray:
+        """ Method used to count agents in each state.
+
+        Returns:
+            numpy.Array: counts of shape (R, number of states).
+        """
+        n_states = len(self.disease.states)
+        offsets = np.arange(self.replications)[:, None]*n_states
+        return np.bincount((self.states + offsets).ravel(),
+                           minlength=self.replications*n_states
+                           ).reshape(self.replications, n_states)
+
+    def infection_probabilities(self) -> np.ndarray:
+        """ Method used to compute the probability of infection of each
+        agent in each replication, given the infectious agents it is in
+        contact with.
+
+        Returns:
+            numpy.Array: probabilities of shape (R, N).
+        """
+        susceptible = np.isin(self.states, self.disease.susceptible_ids)
+        infectious = np.isin(self.states, self.disease.infectious_ids)
+        log_escape = np.log1p(-self.edge_prob)
+        offsets = np.arange(self.replications)[:, None]*self.size
+        total = np.zeros(self.replications*self.size)
+        for a, b in [(self.source, self.target), (self.target, self.source)]:
+            at_risk = susceptible[:, a] & infectious[:, b]
+            total += np.bincount((a + offsets)[at_risk],
+                                 weights=log_escape[at_risk],
+                                 minlength=len(total))
+        return -np.expm1(total).reshape(self.replications, self.size)
+
+    def step(self):
+        """ Method used to execute a step: susceptible agents get infected,
+        and agents whose time in their current state ends before the next
+        step progress to their next state.
+        """
+        probability = self.infection_probabilities()
+        rows, cols = np.nonzero(probability > 0)
+        infected = self._draw(rows, lambda stream, n: stream.random(n)) <= \
+            probability[rows, cols]
+        self._enter(rows[infected], cols[infected], self.disease.infected_id,
+                    self.sim_time)
+        end = self.sim_time + self.step_size
+        due = self.next_time < end
+        while due.any():
+            states = self.states.copy()
+            for state, (next_state, _) in self.disease.progression.items():
+                rows, cols = np.nonzero(due & (states == state))
+                self._enter(rows, cols, next_state,
+                            self.next_time[rows, cols])
+            due = self.next_time < end
+
+    def run(self, stop_time: Union[int, float]) -> np.ndarray:
+        """ Method used to run all replications until a stopping time,
+        collecting the counts of agents in each state at every step.
+
+        Args:
+            stop_time (float): simulation stopping time.
+
+        Returns:
+            numpy.Array: counts of shape (steps, R, number of states).
+        """
+        interventions = list(self.interventions)
+        while self.sim_time <= stop_time:
+            while interventions and interventions[0][0] <= self.sim_time:
+                interventions.pop(0)[1](self)
+            self.step()
+            self.history.append(self.counts())
+            self.sim_time += self.step_size
+        return np.stack(self.history)
+
+    def _enter(self, rows: np.ndarray, cols: np.ndarray, state: int,
+               time: Union[float, np.ndarray]):
+        """ Method used to move agents to a state, and sample the time they
+        will spend in it. Agents are given by replication (rows, sorted)
+        and position (cols).
+        """
+        self.states[rows, cols] = state
+        if state in self.disease.progression:
+            sampler = self.disease.progression[state][1]
+            self.next_time[rows, cols] = time + self._draw(rows, sampler)
+        else:
+            self.next_time[rows, cols] = np.inf
+
+    def _draw(self, rows: np.ndarray,
+              sampler: Callable[[np.random.Generator, int], np.ndarray]
+              ) -> np.ndarray:
+        """ Method used to draw a variate for each entry of rows (sorted
+        replication indices), each replication drawing from its own stream
+        in a single call.
+        """
+        counts = np.bincount(rows, minlength=self.replications)
+        return np.concatenate(
+            [np.empty(0)] + [sampler(self.streams[r], counts[r])
+                             for r in np.flatnonzero(counts)])
@@ -0,0 +1,131 @@
+import json
+import os
+import igraph as ig
+import numpy as np
+import pandas as pd
+
+BUNDLE_MAGIC = b'EPYBNDL1'
+BUNDLE_ALIGNMENT = 4096
+
+
+def write_bundle(filename, columns, layers, metadata=None):
+    """ Writes population columns and layers' edges into a single binary
+    file that can be memory-mapped. The file starts with a magic string,
+    the length of a JSON header and the header, which describes the
+    arrays, followed by the arrays' raw data aligned to pages.
+
+    Args:
+        filename (str): path to the bundle.
+        columns (dict): numeric arrays by column.
+        layers (dict): (number of vertices, edges array of shape (E, 2)) by
+                       layer label.
+        metadata (dict, optional): mapping from category values to codes
+                                   for each categorical column.
+                                   Defaults to None.
+    """
+    arrays = {}
+    for label, values in columns.items():
+        values = np.ascontiguousarray(values)
+        if values.dtype.kind not in 'biuf':
+            raise ValueError(
+                'Column {} is not numeric, encode it first.'.format(label))
+        arrays['column/' + label] = values
+    for label, (_, edges) in layers.items():
+        arrays['layer/' + label] = np.ascontiguousarray(
+            np.asarray(edges, dtype=np.int32).reshape(-1, 2))
+    header = {'columns': list(columns.keys()),
+              'layers': {label: int(n) for label, (n, _) in layers.items()},
+              'metadata': {} if metadata is None else metadata,
+              'arrays': {}}
+    offset = 0
+    for name, values in arrays.items():
+        header['arrays'][name] = {'dtype': values.dtype.str,
+                                  'shape': list(values.shape),
+                                  'offset': offset}
+        offset += -(-values.nbytes // BUNDLE_ALIGNMENT)*BUNDLE_ALIGNMENT
+    encoded = json.dumps(header).encode()
+    start = -(-(len(BUNDLE_MAGIC) + 8 + len(encoded)) //
+              BUNDLE_ALIGNMENT)*BUNDLE_ALIGNMENT
+    with open(filename, 'wb') as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(np.uint64(start).tobytes())
+        f.write(encoded)
+        for name, values in arrays.items():
+            f.seek(start + header['arrays'][name]['offset'])
+            f.write(values.tobytes())
+        f.truncate(start + offset)
+
+
+def read_bundle(filename, columns=None):
+    """ Reads a bundle written by write_bundle. Arrays are read-only views
+    of a memory map of the file, so no data is read until used.
+
+    Args:
+        filename (str): path to the bundle.
+        columns (list, optional): columns to read. Defaults to all columns.
+
+    Returns:
+        (dict, dict, dict): arrays by column, (number of vertices, edges)
+                            by layer label, and mapping from category values
+                            to codes for each categorical column.
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+            raise ValueError('{} is not a bundle.'.format(filename))
+        start = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(start - len(BUNDLE_MAGIC) - 8)
+                            .rstrip(b'\0'))
+    data = np.memmap(filename, dtype=np.uint8, mode='r')
+
+    def view(name):
+        spec = header['arrays'][name]
+        dtype = np.dtype(spec['dtype'])
+        size = int(np.prod(spec['shape']))*dtype.itemsize
+        begin = start + spec['offset']
+        return data[begin:begin + size].view(dtype).reshape(spec['shape'])
+
+    if columns is None:
+        columns = header['columns']
+    X = {label: view('column/' + label) for label in columns}
+    layers = {label: (n, view('layer/' + label))
+              for label, n in header['layers'].items()}
+    metadata = {label: codes for label, codes in header['metadata'].items()
+                if label in X}
+    return X, layers, metadata
+
+
+def graphml_to_bundle(directory, filename, population_file='population.csv',
+                      layers=None):
+    """ Converts a scenario stored as a population csv file and a GraphML
+    file per layer (i.e. the case-study directories) into a bundle.
+    String columns are mapped to integer codes (-1 for missing values),
+    as done by from_arrow.
+
+    Args:
+        directory (str): directory of the scenario.
+        filename (str): path to the bundle.
+        population_file (str, optional): name of the population file.
+                                         Defaults to 'population.csv'.
+        layers (list, optional): names of the layer files. Defaults to all
+                                 other files of the directory.
+    """
+    df = pd.read_csv(os.path.join(directory, population_file))
+    columns, metadata = {}, {}
+    for col, values in df.items():
+        if values.dtype.kind in 'biuf':
+            columns[col] = values.values
+        else:
+            codes, categories = pd.factorize(values)
+            columns[col] = codes.astype(np.int32)
+            metadata[col] = {str(val): i for i, val in enumerate(categories)}
+    if layers is None:
+        layers = sorted(name for name in os.listdir(directory)
+                        if name != population_file and
+                        not name.startswith('.') and
+                        os.path.isfile(os.path.join(directory, name)))
+    edges = {}
+    for label in layers:
+        g = ig.Graph.Read_GraphML(os.path.join(directory, label))
+        edges[label] = (g.vcount(), np.array(g.get_edgelist(),
+                                             dtype=np.int32).reshape(-1, 2))
+    write_bundle(filename, columns, edges, metadata)
@@ -0,0 +1,312 @@
+from . import AgentBasedSim, Simulator
+from . import seed_globals
+from typing import Callable, Dict, List, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+class RunningDistance:
+    """ Stop condition that computes the euclidean distance between a
+    collected statistic (i.e. daily infected) and observed data as values
+    are collected. As the distance can only grow with new values, the
+    simulation is stopped as soon as it exceeds the tolerance, since the
+    replication will be rejected anyway.
+    """
+
+    def __init__(self, label: str, observed: np.ndarray,
+                 tolerance: float = np.inf):
+        """
+        Args:
+            label (str): label of the collected statistic.
+            observed (numpy.Array): observed values, one per collection.
+            tolerance (float, optional): maximum distance accepted.
+                                         Defaults to np.inf.
+        """
+        self.label = label
+        self.observed = np.asarray(observed, dtype=float)
+        self.tolerance = tolerance
+        self.sum_squares = 0.0
+        self.compared = 0
+
+    def __call__(self, simulator: Simulator) -> bool:
+        try:
+            values = simulator.collector[self.label]
+        except KeyError:
+            return False
+        n = min(len(values), len(self.observed))
+        if n > self.compared:
+            new = np.asarray(values[self.compared:n], dtype=float)
+            self.sum_squares += np.sum(
+                (new - self.observed[self.compared:n])**2)
+            self.compared = n
+        return self.distance() > self.tolerance
+
+    def distance(self) -> float:
+        """ Method used to get the distance over the values compared.
+
+        Returns:
+            float: euclidean distance.
+        """
+        return np.sqrt(self.sum_squares)
+
+
+def evaluate_candidate(scenario_factory: Callable[..., AgentBasedSim],
+                       params: dict, seeds: dict,
+                       stop_time: Union[float, int], label: str,
+                       observed: np.ndarray,
+                       tolerance: float) -> Tuple[float, bool]:
+    """ Simulates a candidate set of parameters and computes its distance
+    to the observed data, stopping the simulation early if the distance
+    exceeds the tolerance.
+
+    Args:
+        scenario_factory (callable): function receiving the parameters as
+                                     keyword arguments and returning an
+                                     AgentBasedSim object.
+        params (dict): candidate parameters.
+        seeds (dict): seeds dictionary, as given to AgentBasedSim.run.
+        stop_time (float): simulation stopping time.
+        label (str): label of the collected statistic.
+        observed (numpy.Array): observed values.
+        tolerance (float): maximum distance accepted.
+
+    Returns:
+        (float, bool): distance (inf if rejected early), and whether the
+                       simulation was stopped early.
+    """
+    seed_globals(seeds)
+    sim = scenario_factory(**params)
+    distance = RunningDistance(label, observed, tolerance)
+    sim.add_stop_condition(distance)
+    sim.run(stop_time, seeds=dict(seeds), verbose=False)
+    if sim.stopped:
+        return np.inf, True
+    return distance.distance(), False
+
+
+class ABCCalibration:
+    """ Approximate Bayesian computation (ABC) of model parameters, such as
+    a disease's infection probability or dwell times, from an observed
+    series (i.e. daily cases). Parameters have uniform priors within
+    bounds. Candidate parameters are simulated and accepted if the
+    distance between the collected series and the observed data is within
+    a tolerance. Candidates are simulated in parallel, and each
+    simulation stops as soon as its running distance exceeds the
+    tolerance.
+
+    Two algorithms are implemented: rejection sampling from the prior,
+    and sequential Monte Carlo (ABC-SMC, Beaumont et al. 2009), which
+    moves a population of particles through decreasing tolerances.
+    """
+
+    def __init__(self, scenario_factory: Callable[..., AgentBasedSim],
+                 priors: Dict[str, Tuple[float, float]],
+                 observed: Union[List[float], np.ndarray],
+                 label: str, stop_time: Union[float, int],
+                 seed_labels: List[str], seed: int = 0,
+                 processes: int = None):
+        """
+        Args:
+            scenario_factory (callable): function receiving parameters as
+                                         keyword arguments and returning
+                                         an AgentBasedSim object. Must be
+                                         picklable if processes > 1.
+            priors (dict): (lower, upper) bounds of each parameter.
+            observed (list): observed values, one per collection of label.
+            label (str): label of the collected statistic compared.
+            stop_time (float): simulation stopping time.
+            seed_labels (list): keys of the seeds dictionary required by
+                                the simulation (i.e. disease labels).
+            seed (int, optional): seed of the calibration. Defaults to 0.
+            processes (int, optional): number of worker processes. If 1,
+                                       candidates run in the current
+                                       process. Defaults to the number of
+                                       CPUs.
+        """
+        self.scenario_factory = scenario_factory
+        self.names = list(priors.keys())
+        self.lower = np.array([priors[n][0] for n in self.names], float)
+        self.upper = np.array([priors[n][1] for n in self.names], float)
+        self.observed = np.asarray(observed, dtype=float)
+        self.label = label
+        self.stop_time = stop_time
+        self.seed_labels = seed_labels
+        self.stream = np.random.default_rng(seed)
+        self.processes = processes
+        self.simulations = 0
+        self.early_stops = 0
+
+    def rejection(self, n_samples: int, tolerance: float,
+                  batch_size: int = None, max_simulations: int = None
+                  ) -> dict:
+        """ Method used to sample the posterior by rejection: candidates
+        are drawn from the prior until n_samples are accepted.
+
+        Args:
+            n_samples (int): number of accepted samples.
+            tolerance (float): maximum distance accepted.
+            batch_size (int, optional): candidates simulated at once.
+                                        Defaults to n_samples.
+            max_simulations (int, optional): maximum number of simulations.
+                                             Defaults to no limit.
+
+        Returns:
+            dict: accepted 'params' (array of shape (n, parameters)),
+                  'distances', 'names' and counters of simulations.
+        """
+        batch_size = n_samples if batch_size is None else batch_size
+        accepted, distances = [], []
+        while len(accepted) < n_samples:
+            if max_simulations is not None and \
+                    self.simulations >= max_simulations:
+                break
+            candidates = self.sample_prior(batch_size)
+            for theta, d in zip(candidates,
+                                self.evaluate(candidates, tolerance)):
+                if d <= tolerance:
+                    accepted.append(theta)
+                    distances.append(d)
+        return self._result(np.array(accepted[:n_samples]).reshape(
+            -1, len(self.names)), np.array(distances[:n_samples]))
+
+    def smc(self, n_particles: int, generations: int,
+            quantile: float = 0.5, initial_tolerance: float = np.inf,
+            max_simulations: int = None) -> dict:
+        """ Method used to sample the posterior by sequential Monte Carlo.
+        The tolerance of each generation is the given quantile of the
+        distances of the previous generation's particles. New particles
+        are drawn from the previous ones and perturbed with a gaussian
+        kernel of twice their weighted covariance.
+
+        Args:
+            n_particles (int): number of particles per generation.
+            generations (int): number of generations.
+            quantile (float, optional): quantile used to set tolerances.
+                                        Defaults to 0.5.
+            initial_tolerance (float, optional): tolerance of the first
+                                                 generation, sampled from
+                                                 the prior.
+                                                 Defaults to np.inf.
+            max_simulations (int, optional): maximum number of simulations.
+                                             Defaults to no limit.
+
+        Returns:
+            dict: final 'params', 'weights', 'distances', 'names',
+                  'tolerances' of each generation and counters of
+                  simulations.
+        """
+        result = self.rejection(n_particles, initial_tolerance,
+                                max_simulations=max_simulations)
+        particles, distances = result['params'], result['distances']
+        weights = np.full(len(particles), 1/max(len(particles), 1))
+        tolerances = [initial_tolerance]
+        for _ in range(1, generations):
+            if len(particles) < 2 or (max_simulations is not None and
+                                      self.simulations >= max_simulations):
+                break
+            tolerance = np.quantile(distances, quantile)
+            covariance = 2*np.atleast_2d(np.cov(particles.T,
+                                                aweights=weights))
+            new_particles, new_distances = [], []
+            while len(new_particles) < n_particles:
+                if max_simulations is not None and \
+                        self.simulations >= max_simulations:
+                    break
+                n = n_particles - len(new_particles)
+                idx = self.stream.choice(len(particles), size=n, p=weights)
+                candidates = particles[idx] + \
+                    self.stream.multivariate_normal(
+                        np.zeros(len(self.names)), covariance, size=n)
+                candidates = candidates[self.in_prior(candidates)]
+                for theta, d in zip(candidates,
+                                    self.evaluate(candidates, tolerance)):
+                    if d <= tolerance:
+                        new_particles.append(theta)
+                        new_distances.append(d)
+            if len(new_particles) == 0:
+                break
+            new_particles = np.array(new_particles[:n_particles])
+            new_weights = self._weights(new_particles, particles, weights,
+                                        covariance)
+            particles, weights = new_particles, new_weights
+            distances = np.array(new_distances[:n_particles])
+            tolerances.append(tolerance)
+        result = self._result(particles, distances)
+        result['weights'] = weights
+        result['tolerances'] = tolerances
+        return result
+
+    def evaluate(self, candidates: np.ndarray,
+                 tolerance: float) -> np.ndarray:
+        """ Method used to simulate candidates, in parallel if possible.
+
+        Args:
+            candidates (numpy.Array): array of shape (n, parameters).
+            tolerance (float): maximum distance accepted.
+
+        Returns:
+            numpy.Array: distance of each candidate (inf if rejected early).
+        """
+        args = [(self.scenario_factory, dict(zip(self.names, theta)),
+                 self.draw_seeds(), self.stop_time, self.label,
+                 self.observed, tolerance) for theta in candidates]
+        if self.processes == 1:
+            results = [evaluate_candidate(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                results = list(executor.map(evaluate_candidate, *zip(*args)))
+        self.simulations += len(results)
+        self.early_stops += sum(stopped for _, stopped in results)
+        return np.array([d for d, _ in results], dtype=float)
+
+    def sample_prior(self, n: int) -> np.ndarray:
+        """ Method used to draw parameters from the prior.
+
+        Args:
+            n (int): number of samples.
+
+        Returns:
+            numpy.Array: array of shape (n, parameters).
+        """
+        return self.stream.uniform(self.lower, self.upper,
+                                   size=(n, len(self.names)))
+
+    def in_prior(self, candidates: np.ndarray) -> np.ndarray:
+        """ Method used to check which candidates have positive prior
+        density.
+
+        Args:
+            candidates (numpy.Array): array of shape (n, parameters).
+
+        Returns:
+            numpy.Array: boolean array of size n.
+        """
+        return np.all((candidates >= self.lower) &
+                      (candidates <= self.upper), axis=1)
+
+    def draw_seeds(self) -> dict:
+        """ Method used to draw the seeds dictionary of a simulation.
+
+        Returns:
+            dict: seeds by label.
+        """
+        return {label: int(seed) for label, seed in zip(
+            self.seed_labels,
+            self.stream.integers(0, 2**31 - 1, size=len(self.seed_labels)))}
+
+    def _weights(self, particles: np.ndarray, previous: np.ndarray,
+                 previous_weights: np.ndarray,
+                 covariance: np.ndarray) -> np.ndarray:
+        # Uniform priors have constant density, so weights are inversely
+        # proportional to the density of the perturbation mixture.
+        precision = np.linalg.pinv(covariance)
+        diff = particles[:, None, :] - previous[None, :, :]
+        kernel = np.exp(-0.5*np.einsum('ijk,kl,ijl->ij', diff, precision,
+                                       diff))
+        weights = 1/(kernel @ previous_weights)
+        return weights/weights.sum()
+
+    def _result(self, params: np.ndarray, distances: np.ndarray) -> dict:
+        return {'names': list(self.names), 'params': params,
+                'distances': distances, 'simulations': self.simulations,
+                'early_stops': self.early_stops}
@@ -0,0 +1,118 @@
+from typing import Any, List, Tuple
+import os
+import pickle
+import threading
+import numpy as np
+
+CHECKPOINT_MAGIC = b'EPYCKPT1'
+
+
+def dump_checkpoint(state: Any) -> Tuple[bytes, List[bytes]]:
+    """ Serializes a state with pickle protocol 5. Large contiguous
+    buffers (i.e. numpy arrays) are kept out of the pickle stream and
+    copied, so the state can keep changing while they are written.
+
+    Args:
+        state (Any): picklable object.
+
+    Returns:
+        (bytes, list): pickle stream and buffers.
+    """
+    buffers = []
+    data = pickle.dumps(state, protocol=5, buffer_callback=buffers.append)
+    return data, [buffer.raw().tobytes() for buffer in buffers]
+
+
+def write_checkpoint(path: str, data: bytes, buffers: List[bytes]):
+    """ Writes a serialized state. The file holds a magic string, the sizes
+    of the pickle stream and buffers, the pickle stream and the raw
+    buffers. It is written to a temporary file and renamed, so an existing
+    checkpoint is only replaced by a complete one.
+
+    Args:
+        path (str): path to the checkpoint.
+        data (bytes): pickle stream.
+        buffers (list): out-of-band buffers.
+    """
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(CHECKPOINT_MAGIC)
+        f.write(np.array([len(data), len(buffers)], dtype='<u8').tobytes())
+        f.write(np.array([len(buffer) for buffer in buffers],
+                         dtype='<u8').tobytes())
+        f.write(data)
+        for buffer in buffers:
+            f.write(buffer)
+    os.replace(temporary, path)
+
+
+def read_checkpoint(path: str) -> Any:
+    """ Reads a state written by write_checkpoint.
+
+    Args:
+        path (str): path to the checkpoint.
+
+    Raises:
+        ValueError: if the file is not a checkpoint.
+
+    Returns:
+        Any: deserialized state.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+            raise ValueError('{} is not a checkpoint.'.format(path))
+        size, count = np.frombuffer(f.read(16), dtype='<u8')
+        sizes = np.frombuffer(f.read(8*int(count)), dtype='<u8')
+        data = f.read(int(size))
+        buffers = [bytearray(f.read(int(n))) for n in sizes]
+    return pickle.loads(data, buffers=buffers)
+
+
+class CheckpointWriter:
+    """ Class used to write checkpoints on a background thread. The state is
+    serialized when a checkpoint is requested, and only the writing to disk
+    happens in the background, so the simulation continues while a
+    checkpoint is written. At most one checkpoint is written at a time: a
+    new request waits until the previous one is written.
+    """
+
+    def __init__(self):
+        self.thread = None
+        self.error = None
+
+    def save(self, path: str, state: Any, block: bool = True):
+        """ Method used to write a checkpoint.
+
+        Args:
+            path (str): path to the checkpoint.
+            state (Any): picklable object.
+            block (bool, optional): whether to wait until the checkpoint is
+                                    written. Defaults to True.
+        """
+        data, buffers = dump_checkpoint(state)
+        self.wait()
+        self.thread = threading.Thread(target=self._run,
+                                       args=(path, data, buffers),
+                                       daemon=True)
+        self.thread.start()
+        if block:
+            self.wait()
+
+    def wait(self):
+        """ Method used to wait until the last checkpoint is written.
+
+        Raises:
+            IOError: if the last checkpoint could not be written.
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise IOError('Failed to write checkpoint') from error
+
+    def _run(self, path: str, data: bytes, buffers: List[bytes]):
+        try:
+            write_checkpoint(path, data, buffers)
+        except Exception as error:
+            self.error = error
@@ -0,0 +1,255 @@
+from typing import Callable, Dict, List, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+class GaussianProcess:
+    """ Gaussian process regression with a squared exponential kernel, used
+    as surrogate of simulation outputs. Inputs are expected to be scaled to
+    the unit hypercube, and each output is standardized before fitting.
+    Outputs share the kernel, so a single Cholesky factorization is
+    computed per fit.
+
+    The length scale and noise are chosen among a grid of values by
+    maximizing the log marginal likelihood summed over outputs.
+    """
+
+    def __init__(self, length_scales: List[float] = None,
+                 noises: List[float] = None):
+        """
+        Args:
+            length_scales (list, optional): candidate length scales.
+                                            Defaults to a logarithmic grid
+                                            between 0.05 and 2.
+            noises (list, optional): candidate noise variances, relative to
+                                     the output variance. Defaults to a
+                                     logarithmic grid between 1e-6 and 0.3.
+        """
+        self.length_scales = np.geomspace(0.05, 2, 12) \
+            if length_scales is None else np.asarray(length_scales)
+        self.noises = np.geomspace(1e-6, 0.3, 8) \
+            if noises is None else np.asarray(noises)
+        self.length_scale = None
+        self.noise = None
+
+    def fit(self, X: np.ndarray, Y: np.ndarray) -> 'GaussianProcess':
+        """ Method used to fit the process to observations.
+
+        Args:
+            X (numpy.Array): inputs of shape (n, dimensions).
+            Y (numpy.Array): outputs of shape (n, outputs).
+
+        Returns:
+            GaussianProcess: fitted process.
+        """
+        self.X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        self.mean = Y.mean(axis=0)
+        self.scale = Y.std(axis=0)
+        self.scale[self.scale == 0] = 1
+        Z = (Y - self.mean)/self.scale
+        sq_dist = self._sq_dist(self.X, self.X)
+        best = -np.inf
+        for length_scale in self.length_scales:
+            K = np.exp(-0.5*sq_dist/length_scale**2)
+            for noise in self.noises:
+                try:
+                    L = np.linalg.cholesky(K + noise*np.eye(len(K)))
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = np.linalg.solve(L.T, np.linalg.solve(L, Z))
+                likelihood = -0.5*np.sum(Z*alpha) - \
+                    Z.shape[1]*np.sum(np.log(np.diag(L)))
+                if likelihood > best:
+                    best = likelihood
+                    self.length_scale, self.noise = length_scale, noise
+                    self.L, self.alpha = L, alpha
+        return self
+
+    def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Method used to predict outputs at new inputs.
+
+        Args:
+            X (numpy.Array): inputs of shape (m, dimensions).
+
+        Returns:
+            (numpy.Array, numpy.Array): predicted mean and standard
+                                        deviation of shape (m, outputs).
+        """
+        X = np.asarray(X, dtype=float)
+        K_s = np.exp(-0.5*self._sq_dist(X, self.X)/self.length_scale**2)
+        mean = K_s @ self.alpha
+        v = np.linalg.solve(self.L, K_s.T)
+        variance = np.clip(1 - np.sum(v**2, axis=0), 0, None)
+        std = np.sqrt(variance)[:, None]*self.scale
+        return mean*self.scale + self.mean, np.broadcast_to(std, mean.shape)
+
+    @staticmethod
+    def _sq_dist(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+        return np.clip(np.sum(A**2, axis=1)[:, None] +
+                       np.sum(B**2, axis=1)[None, :] - 2*A @ B.T, 0, None)
+
+
+class Emulator:
+    """ Class used to replace simulations by a surrogate model in
+    sensitivity analyses and sweeps over scenario parameters (i.e.
+    masking time or vaccination coverage).
+
+    The simulator is a function receiving the parameters as keyword
+    arguments and returning summary outputs (i.e. peak and total
+    infected), usually averaged over some replications. A gaussian
+    process is fitted to the outputs of a design of runs, which starts as
+    a latin hypercube and is refined adaptively by simulating the points
+    where the predicted standard deviation is highest. Queries are
+    answered from the surrogate when its predicted standard deviation is
+    within tolerance, and simulated (and added to the design) otherwise.
+    """
+
+    def __init__(self, simulator: Callable[..., Union[float, np.ndarray]],
+                 bounds: Dict[str, Tuple[float, float]], seed: int = 0,
+                 processes: int = 1):
+        """
+        Args:
+            simulator (callable): function receiving parameters as keyword
+                                  arguments and returning summary outputs.
+                                  Must be picklable if processes > 1.
+            bounds (dict): (lower, upper) bounds of each parameter.
+            seed (int, optional): seed of the design. Defaults to 0.
+            processes (int, optional): number of worker processes used to
+                                       simulate design points. If None, the
+                                       number of CPUs. Defaults to 1.
+        """
+        self.simulator = simulator
+        self.names = list(bounds.keys())
+        self.lower = np.array([bounds[n][0] for n in self.names], float)
+        self.upper = np.array([bounds[n][1] for n in self.names], float)
+        self.stream = np.random.default_rng(seed)
+        self.processes = processes
+        self.X = np.empty((0, len(self.names)))
+        self.Y = None
+        self.process = GaussianProcess()
+
+    def design(self, n_points: int) -> np.ndarray:
+        """ Method used to simulate an initial latin hypercube design and
+        fit the surrogate.
+
+        Args:
+            n_points (int): number of design points.
+
+        Returns:
+            numpy.Array: outputs of the design points.
+        """
+        strata = (np.arange(n_points)[:, None] +
+                  self.stream.random((n_points, len(self.names))))/n_points
+        for j in range(len(self.names)):
+            strata[:, j] = self.stream.permutation(strata[:, j])
+        return self.add_points(self._from_unit(strata))
+
+    def refine(self, n_points: int, batch_size: int = 1,
+               n_candidates: int = 2048) -> np.ndarray:
+        """ Method used to add design points where the surrogate is most
+        uncertain. Each batch is chosen among random candidates, and the
+        surrogate is refitted after simulating each batch.
+
+        Args:
+            n_points (int): number of design points to add.
+            batch_size (int, optional): points simulated at once.
+                                        Defaults to 1.
+            n_candidates (int, optional): number of random candidates.
+                                          Defaults to 2048.
+
+        Returns:
+            numpy.Array: added design points, of shape (n, parameters).
+        """
+        added = []
+        while len(added) < n_points:
+            n = min(batch_size, n_points - len(added))
+            candidates = self.stream.random((n_candidates, len(self.names)))
+            _, std = self.process.predict(candidates)
+            score = np.max(std/self.process.scale, axis=1)
+            points = self._from_unit(candidates[np.argsort(-score)[:n]])
+            self.add_points(points)
+            added.extend(points)
+        return np.array(added)
+
+    def predict(self, points: Union[dict, np.ndarray]
+                ) -> Tuple[np.ndarray, np.ndarray]:
+        """ Method used to predict outputs from the surrogate.
+
+        Args:
+            points (numpy.Array or dict): array of shape (n, parameters),
+                                          or dict of arrays by parameter.
+
+        Returns:
+            (numpy.Array, numpy.Array): predicted mean and standard
+                                        deviation of shape (n, outputs).
+        """
+        return self.process.predict(self._to_unit(self._as_array(points)))
+
+    def query(self, points: Union[dict, np.ndarray],
+              tolerance: Union[float, np.ndarray]
+              ) -> Tuple[np.ndarray, np.ndarray]:
+        """ Method used to get outputs at given points, from the surrogate
+        when the predicted standard deviation is within tolerance, and by
+        simulating otherwise. Simulated points are added to the design.
+
+        Args:
+            points (numpy.Array or dict): array of shape (n, parameters),
+                                          or dict of arrays by parameter.
+            tolerance (float or numpy.Array): maximum standard deviation,
+                                              for all or each output.
+
+        Returns:
+            (numpy.Array, numpy.Array): outputs of shape (n, outputs), and
+                                        boolean array marking simulated
+                                        points.
+        """
+        points = self._as_array(points)
+        mean, std = self.predict(points)
+        simulated = np.any(std > tolerance, axis=1)
+        if simulated.any():
+            mean = mean.copy()
+            mean[simulated] = self.add_points(points[simulated])
+        return mean, simulated
+
+    def add_points(self, points: np.ndarray) -> np.ndarray:
+        """ Method used to simulate points, add them to the design and
+        refit the surrogate.
+
+        Args:
+            points (numpy.Array): array of shape (n, parameters).
+
+        Returns:
+            numpy.Array: outputs of shape (n, outputs).
+        """
+        params = [dict(zip(self.names, map(float, point)))
+                  for point in points]
+        if self.processes == 1:
+            outputs = [self.simulator(**p) for p in params]
+        else:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                outputs = list(executor.map(_simulate,
+                                            [self.simulator]*len(params),
+                                            params))
+        outputs = np.array(outputs, dtype=float).reshape(len(points), -1)
+        self.X = np.vstack([self.X, points])
+        self.Y = outputs if self.Y is None else np.vstack([self.Y, outputs])
+        self.process.fit(self._to_unit(self.X), self.Y)
+        return outputs
+
+    def _as_array(self, points: Union[dict, np.ndarray]) -> np.ndarray:
+        if isinstance(points, dict):
+            points = np.column_stack([np.ravel(points[n])
+                                      for n in self.names])
+        return np.atleast_2d(np.asarray(points, dtype=float))
+
+    def _to_unit(self, points: np.ndarray) -> np.ndarray:
+        return (points - self.lower)/(self.upper - self.lower)
+
+    def _from_unit(self, points: np.ndarray) -> np.ndarray:
+        return self.lower + points*(self.upper - self.lower)
+
+
+def _simulate(simulator: Callable[..., Union[float, np.ndarray]],
+              params: dict) -> Union[float, np.ndarray]:
+    return simulator(**params)
@@ -0,0 +1,347 @@
+import numpy as np
+import pandas as pd
+from typing import Union, List
+
+
+class TransitionLog:
+    """ Append-only log of disease state transitions. Each record holds
+    the simulation time, the agent index, the disease id and the states
+    before and after the transition. Records are stored in a structured
+    numpy buffer that grows geometrically, so appending is amortized O(1)
+    and the log can be queried with vectorized operations.
+
+    Because simulation time never decreases, records are sorted by time,
+    which allows searching the log using binary search. A state of -1
+    denotes an empty slot, and is used to record agents joining or
+    leaving a dynamic population.
+    """
+
+    DTYPE = np.dtype([('time', np.float64),
+                      ('agent', np.int64),
+                      ('disease', np.int16),
+                      ('from_state', np.int16),
+                      ('to_state', np.int16)])
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+            capacity (int, optional): initial number of records allocated.
+                                      Defaults to 1024.
+        """
+        self.buffer = np.empty(max(int(capacity), 1), dtype=self.DTYPE)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, time: Union[int, float], agents: np.ndarray,
+               disease: int, from_states: np.ndarray, to_state: int):
+        """ Method used to add transitions to the log.
+
+        Args:
+            time (float): simulation time of the transitions.
+            agents (numpy.Array): indices of the agents.
+            disease (int): id of the disease.
+            from_states (numpy.Array): states before the transition.
+            to_state (int): state after the transition.
+        """
+        n = len(agents)
+        if n == 0:
+            return
+        if self.size + n > len(self.buffer):
+            new_buffer = np.empty(max(2*len(self.buffer), self.size + n),
+                                  dtype=self.DTYPE)
+            new_buffer[:self.size] = self.buffer[:self.size]
+            self.buffer = new_buffer
+        records = self.buffer[self.size:self.size + n]
+        records['time'] = time
+        records['agent'] = agents
+        records['disease'] = disease
+        records['from_state'] = from_states
+        records['to_state'] = to_state
+        self.size += n
+
+    def records(self, disease: int = None) -> np.ndarray:
+        """ Method used to retrieve the logged transitions.
+
+        Args:
+            disease (int, optional): id of the disease to filter. If not
+                                     given, all records are returned.
+
+        Returns:
+            numpy.Array: structured array with records. If no disease is
+                         given, it is a view of the log.
+        """
+        records = self.buffer[:self.size]
+        if disease is None:
+            return records
+        return records[records['disease'] == disease]
+
+    def clear(self):
+        """ Method used to remove all records from the log.
+        """
+        self.size = 0
+
+    def counts(self, disease: int, initial_states: np.ndarray,
+               n_states: int, times: Union[List[float], np.ndarray]
+               ) -> np.ndarray:
+        """ Method used to rebuild the number of agents in each state at
+        a sequence of times. Counts at time t include all transitions that
+        happened at or before t.
+
+        Args:
+            disease (int): id of the disease.
+            initial_states (numpy.Array): agents' states before the first
+                                          logged transition.
+            n_states (int): number of states of the disease.
+            times (list): sorted sequence of times.
+
+        Returns:
+            numpy.Array: array of shape (len(times), n_states).
+        """
+        times = np.asarray(times, dtype=np.float64)
+        records = self.records(disease)
+        initial_states = np.asarray(initial_states)
+        initial = np.bincount(initial_states[initial_states >= 0],
+                              minlength=n_states)
+        bins = np.searchsorted(times, records['time'], side='left')
+        delta = np.zeros((len(times) + 1, n_states), dtype=np.int64)
+        valid = records['from_state'] >= 0
+        np.add.at(delta, (bins[valid], records['from_state'][valid]), -1)
+        valid = records['to_state'] >= 0
+        np.add.at(delta, (bins[valid], records['to_state'][valid]), 1)
+        return initial + np.cumsum(delta[:-1], axis=0)
+
+    def states_at(self, disease: int, initial_states: np.ndarray,
+                  time: Union[int, float]) -> np.ndarray:
+        """ Method used to rebuild the states vector at a given time,
+        including all transitions that happened at or before that time.
+
+        Args:
+            disease (int): id of the disease.
+            initial_states (numpy.Array): agents' states before the first
+                                          logged transition.
+            time (float): target time.
+
+        Returns:
+            numpy.Array: agents' states.
+        """
+        records = self.records(disease)
+        records = records[:np.searchsorted(records['time'], time,
+                                           side='right')]
+        states = np.array(initial_states, copy=True)
+        if len(records) > 0:
+            # Keep only the last transition of each agent
+            agents, last = np.unique(records['agent'][::-1],
+                                     return_index=True)
+            last = len(records) - 1 - last
+            if len(states) <= agents[-1]:
+                states = np.concatenate(
+                    [states, np.full(agents[-1] + 1 - len(states), -1,
+                                     dtype=states.dtype)])
+            states[agents] = records['to_state'][last]
+        return states
+
+
+class StateHistory:
+    """ Compact record of a sequence of states vectors (i.e. one per day).
+    Full copies (keyframes) are stored every keyframe_interval records,
+    and every other record only stores the indices of agents whose state
+    changed and their new values. As only a small fraction of agents
+    change state between consecutive records, this uses much less memory
+    than storing a copy of the states vector per record.
+
+    Any record can be retrieved by indexing (history[k]), which applies
+    at most keyframe_interval deltas to the closest previous keyframe. A
+    keyframe is also stored whenever the size of the states vector
+    changes (i.e. a dynamic population grows).
+    """
+
+    def __init__(self, keyframe_interval: int = 30):
+        """
+        Args:
+            keyframe_interval (int, optional): number of records between
+                                               keyframes. Defaults to 30.
+        """
+        try:
+            assert keyframe_interval > 0
+        except AssertionError:
+            raise ValueError('Keyframe interval must be positive')
+        self.keyframe_interval = keyframe_interval
+        self.times = []
+        self.keyframes = []
+        self.keyframe_positions = []
+        self.indices = []
+        self.values = []
+        self.last = None
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def record(self, time: Union[int, float], states: np.ndarray):
+        """ Method used to add a states vector to the history.
+
+        Args:
+            time (float): simulation time of the record.
+            states (numpy.Array): agents' states.
+        """
+        states = np.asarray(states)
+        if len(self) == 0 or states.shape != self.last.shape or \
+                len(self) - self.keyframe_positions[-1] >= \
+                self.keyframe_interval:
+            self.keyframe_positions.append(len(self))
+            self.keyframes.append(states.copy())
+            changed = np.array([], dtype=np.int32)
+            self.last = states.copy()
+        else:
+            changed = np.flatnonzero(states != self.last).astype(np.int32)
+            self.last[changed] = states[changed]
+        self.times.append(time)
+        self.indices.append(changed)
+        self.values.append(states[changed])
+
+    def __getitem__(self, k: int) -> np.ndarray:
+        """ Method used to retrieve the states vector of a record.
+
+        Args:
+            k (int): position of the record.
+
+        Returns:
+            numpy.Array: agents' states.
+        """
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('Record out of range')
+        j = np.searchsorted(self.keyframe_positions, k, side='right') - 1
+        start = self.keyframe_positions[j]
+        states = self.keyframes[j].copy()
+        if k > start:
+            indices = np.concatenate(self.indices[start + 1:k + 1])
+            values = np.concatenate(self.values[start + 1:k + 1])
+            # Keep only the last change of each agent
+            indices, last = np.unique(indices[::-1], return_index=True)
+            states[indices] = values[::-1][last]
+        return states
+
+    def at(self, time: Union[int, float]) -> np.ndarray:
+        """ Method used to retrieve the last states vector recorded at or
+        before a given time.
+
+        Args:
+            time (float): target time.
+
+        Returns:
+            numpy.Array: agents' states.
+        """
+        k = np.searchsorted(self.times, time, side='right') - 1
+        if k < 0:
+            raise IndexError('No record before time {}'.format(time))
+        return self[k]
+
+    def __iter__(self):
+        """ Iterates over all records, applying each delta once.
+
+        Yields:
+            numpy.Array: agents' states of each record.
+        """
+        states = None
+        keyframes = dict(zip(self.keyframe_positions, self.keyframes))
+        for k in range(len(self)):
+            if k in keyframes:
+                states = keyframes[k].copy()
+            else:
+                states[self.indices[k]] = self.values[k]
+            yield states.copy()
+
+    def nbytes(self) -> int:
+        """ Method used to compute the memory used by stored arrays.
+
+        Returns:
+            int: number of bytes.
+        """
+        return sum(a.nbytes for a in self.keyframes) + \
+            sum(a.nbytes for a in self.indices) + \
+            sum(a.nbytes for a in self.values)
+
+
+class Stratifier:
+    """ Class used to keep the number of agents in each disease state for
+    each category (stratum) of a population attribute, such as age group
+    or household. Counts are updated incrementally upon each change of
+    state, so they can be collected at every step without scanning the
+    population. Missing values (i.e. agents without a school) are
+    grouped in the stratum labeled None.
+    """
+
+    def __init__(self, values: np.ndarray, states: np.ndarray,
+                 n_states: int):
+        """
+        Args:
+            values (numpy.Array): attribute values of each agent.
+            states (numpy.Array): current disease states of each agent.
+            n_states (int): number of states of the disease.
+        """
+        self.labels = [None]
+        self.codes_by_label = {None: 0}
+        self.codes = self.encode(values)
+        self.counts = np.zeros((len(self.labels), n_states), dtype=np.int64)
+        self.update(np.arange(len(states)),
+                    np.full(len(states), -1), states)
+
+    def encode(self, values: np.ndarray) -> np.ndarray:
+        """ Method used to map attribute values to stratum codes. Values
+        not seen before are added as new strata.
+
+        Args:
+            values (numpy.Array): attribute values.
+
+        Returns:
+            numpy.Array: stratum codes.
+        """
+        codes, uniques = pd.factorize(np.asarray(values))
+        for label in uniques:
+            if label not in self.codes_by_label:
+                self.codes_by_label[label] = len(self.labels)
+                self.labels.append(label)
+        # Missing values (code -1) map to the last entry, the None stratum
+        mapping = np.array([self.codes_by_label[label] for label in uniques]
+                           + [0], dtype=np.int64)
+        return mapping[codes]
+
+    def assign(self, idx: np.ndarray, values: np.ndarray):
+        """ Method used to set the stratum of agents (i.e. new agents).
+        Must be called while agents are not counted in any state.
+
+        Args:
+            idx (numpy.Array): indices of agents.
+            values (numpy.Array): attribute values of the agents.
+        """
+        if len(self.codes) <= np.max(idx, initial=-1):
+            self.codes = np.concatenate(
+                [self.codes, np.zeros(np.max(idx) + 1 - len(self.codes),
+                                      dtype=np.int64)])
+        self.codes[idx] = self.encode(values)
+        if len(self.labels) > len(self.counts):
+            self.counts = np.concatenate(
+                [self.counts,
+                 np.zeros((len(self.labels) - len(self.counts),
+                           self.counts.shape[1]), dtype=np.int64)])
+
+    def update(self, idx: np.ndarray, from_states: np.ndarray,
+               to_states: Union[int, np.ndarray]):
+        """ Method used to update counts upon changes of state. A state of
+        -1 denotes an empty slot.
+
+        Args:
+            idx (numpy.Array): indices of agents.
+            from_states (numpy.Array): states before the change.
+            to_states (int or numpy.Array): states after the change.
+        """
+        codes = self.codes[idx]
+        valid = from_states >= 0
+        np.add.at(self.counts, (codes[valid], from_states[valid]), -1)
+        to_states = np.broadcast_to(to_states, codes.shape)
+        valid = to_states >= 0
+        np.add.at(self.counts, (codes[valid], to_states[valid]), 1)
+
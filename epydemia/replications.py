@@ -0,0 +1,407 @@
+from . import AgentBasedSim, SharedScenario, attach_shared
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import functools
+import os
+import pickle
+import random
+import socket
+import threading
+import time
+import traceback
+import numpy as np
+
+
+class ReplicationRunner:
+    """ Class used to run several replications of a scenario in parallel,
+    using a pool of processes. A scenario is defined by a factory: a
+    callable that takes no arguments and returns an AgentBasedSim object
+    ready to run (population, layers, diseases and interventions added).
+    Each replication builds its own simulation through the factory and
+    runs it with its own dictionary of seeds, as given to
+    AgentBasedSim.run.
+
+    Replications are deterministic per seeds dictionary: before calling
+    the factory, python's and numpy's global generators are seeded from
+    the replication's seeds, so results do not depend on which worker
+    runs a replication or in which order.
+
+    As replications run in other processes, the factory must be
+    picklable (i.e. a function defined at module level, or a
+    functools.partial of one).
+
+    If a SharedScenario is given, workers attach to it once and the
+    factory is called with the attached scenario as its only argument,
+    so it can build the simulation with
+    create_population(how='shared', shared=...) without reading files.
+    """
+
+    def __init__(self, scenario_factory: Callable[..., AgentBasedSim],
+                 stop_time: Union[float, int], processes: int = None,
+                 shared: SharedScenario = None, **run_kwargs):
+        """
+        Args:
+            scenario_factory (callable): function returning an
+                                         AgentBasedSim object.
+            stop_time (float): simulation stopping time.
+            processes (int, optional): number of worker processes. If 1,
+                                       replications run in the current
+                                       process. Defaults to the number of
+                                       CPUs.
+            shared (SharedScenario, optional): published scenario passed
+                                               to the factory.
+                                               Defaults to None.
+            run_kwargs: additional arguments for AgentBasedSim.run.
+        """
+        self.scenario_factory = scenario_factory
+        self.stop_time = stop_time
+        self.processes = processes
+        self.shared = shared
+        self.run_kwargs = run_kwargs
+
+    def run(self, seeds: List[dict]) -> Iterator[Tuple[int, dict]]:
+        """ Method used to run one replication per seeds dictionary.
+        Results are yielded as soon as each replication finishes, which
+        may differ from the order of the seeds.
+
+        Args:
+            seeds (list): list of seeds dictionaries, one per replication.
+
+        Yields:
+            (int, dict): position of the replication in seeds, and the
+                         statistics returned by AgentBasedSim.dump_stats.
+        """
+        if self.processes == 1:
+            for i, replication_seeds in enumerate(seeds):
+                yield i, run_replication(self.scenario_factory,
+                                         self.stop_time, replication_seeds,
+                                         shared=self.shared,
+                                         **self.run_kwargs)
+            return
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            handle = None if self.shared is None else self.shared.handle
+            futures = {executor.submit(run_replication,
+                                       self.scenario_factory,
+                                       self.stop_time, replication_seeds,
+                                       shared=handle, **self.run_kwargs): i
+                       for i, replication_seeds in enumerate(seeds)}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def run_all(self, seeds: List[dict]) -> List[dict]:
+        """ Method used to run one replication per seeds dictionary and
+        wait for all of them.
+
+        Args:
+            seeds (list): list of seeds dictionaries, one per replication.
+
+        Returns:
+            list: statistics of each replication, in the order of seeds.
+        """
+        results = [None]*len(seeds)
+        for i, stats in self.run(seeds):
+            results[i] = stats
+        return results
+
+
+class FileQueue:
+    """ Class used to distribute replications across hosts using a shared
+    directory as task queue, without a scheduler. Each task is a scenario
+    (keyword arguments of the scenario factory) and a seeds dictionary,
+    and the queue is usually filled with the matrix of scenarios and
+    seeds. Any number of workers, on any host with access to the
+    directory, call work to drain it.
+
+    The directory holds one file per task (tasks), per claimed task
+    (leases), and per finished task (results and failed). A worker claims
+    a task by creating its lease file exclusively, and keeps touching it
+    while running the task. Leases not touched for lease_timeout seconds
+    belong to crashed workers and are taken over by other workers, so an
+    interrupted queue resumes by starting workers again. Results are
+    written to a temporary file and renamed, so a result file is always
+    complete. The merge method gathers the results.
+    """
+
+    def __init__(self, directory: str, lease_timeout: float = 300,
+                 heartbeat_interval: float = None):
+        """
+        Args:
+            directory (str): shared directory of the queue. It is created if
+                             it does not exist.
+            lease_timeout (float, optional): seconds after which a lease that
+                                             is not touched is stale.
+                                             Defaults to 300.
+            heartbeat_interval (float, optional): seconds between touches of
+                                                  a lease. Defaults to a
+                                                  fifth of lease_timeout.
+        """
+        self.directory = directory
+        self.lease_timeout = lease_timeout
+        self.heartbeat_interval = lease_timeout/5 \
+            if heartbeat_interval is None else heartbeat_interval
+        for folder in ['tasks', 'leases', 'results', 'failed']:
+            os.makedirs(os.path.join(directory, folder), exist_ok=True)
+
+    def submit(self, scenarios: List[dict], seeds: List[dict]) -> int:
+        """ Method used to add a task per scenario and seeds dictionary.
+        Tasks already in the queue are kept, so submitting the same matrix
+        again does not repeat work.
+
+        Args:
+            scenarios (list): keyword arguments of the scenario factory of
+                              each scenario.
+            seeds (list): seeds dictionaries, as given to AgentBasedSim.run.
+
+        Returns:
+            int: number of tasks in the queue.
+        """
+        for i, params in enumerate(scenarios):
+            for j, replication_seeds in enumerate(seeds):
+                path = self._path('tasks', self.task_id(i, j))
+                if not os.path.exists(path):
+                    self._write(path, {'scenario': i, 'replication': j,
+                                       'params': params,
+                                       'seeds': replication_seeds})
+        return len(self.tasks())
+
+    @staticmethod
+    def task_id(scenario: int, replication: int) -> str:
+        return 's{:06d}_r{:06d}'.format(scenario, replication)
+
+    def tasks(self) -> List[str]:
+        """ Method used to list the ids of all tasks.
+
+        Returns:
+            list: sorted task ids.
+        """
+        return sorted(name[:-4] for name in
+                      os.listdir(os.path.join(self.directory, 'tasks'))
+                      if name.endswith('.pkl'))
+
+    def status(self) -> Dict[str, int]:
+        """ Method used to count tasks by status.
+
+        Returns:
+            dict: number of 'pending', 'running', 'stale', 'done' and
+                  'failed' tasks.
+        """
+        counts = dict.fromkeys(['pending', 'running', 'stale', 'done',
+                                'failed'], 0)
+        for task_id in self.tasks():
+            if os.path.exists(self._path('results', task_id)):
+                counts['done'] += 1
+            elif os.path.exists(self._path('failed', task_id, '.txt')):
+                counts['failed'] += 1
+            elif os.path.exists(self._path('leases', task_id, '.lease')):
+                stale = self._is_stale(self._path('leases', task_id,
+                                                  '.lease'))
+                counts['stale' if stale else 'running'] += 1
+            else:
+                counts['pending'] += 1
+        return counts
+
+    def work(self, scenario_factory: Callable[..., AgentBasedSim],
+             stop_time: Union[float, int], max_tasks: int = None,
+             worker_id: str = None, **run_kwargs) -> int:
+        """ Method used to run tasks until no task can be claimed. Each
+        task builds the simulation with scenario_factory(**params), and
+        runs it as run_replication does.
+
+        Args:
+            scenario_factory (callable): function receiving the parameters
+                                         of a scenario as keyword arguments
+                                         and returning an AgentBasedSim
+                                         object.
+            stop_time (float): simulation stopping time.
+            max_tasks (int, optional): maximum number of tasks to run.
+                                       Defaults to no limit.
+            worker_id (str, optional): name written in leases. Defaults to
+                                       the host name and process id.
+            run_kwargs: additional arguments for AgentBasedSim.run.
+
+        Returns:
+            int: number of tasks run by this worker.
+        """
+        if worker_id is None:
+            worker_id = '{}-{}'.format(socket.gethostname(), os.getpid())
+        done = 0
+        while max_tasks is None or done < max_tasks:
+            task_id = self._claim_next(worker_id)
+            if task_id is None:
+                break
+            lease = self._path('leases', task_id, '.lease')
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat,
+                                         args=(lease, stop), daemon=True)
+            heartbeat.start()
+            try:
+                with open(self._path('tasks', task_id), 'rb') as f:
+                    task = pickle.load(f)
+                factory = functools.partial(scenario_factory,
+                                            **task['params'])
+                stats = run_replication(factory, stop_time, task['seeds'],
+                                        **run_kwargs)
+                self._write(self._path('results', task_id),
+                            dict(task, stats=stats, worker=worker_id))
+            except Exception:
+                with open(self._path('failed', task_id, '.txt'), 'w') as f:
+                    f.write(traceback.format_exc())
+            finally:
+                stop.set()
+                heartbeat.join()
+                self._release(lease)
+            done += 1
+        return done
+
+    def merge(self, allow_missing: bool = False
+              ) -> Dict[Tuple[int, int], dict]:
+        """ Method used to gather the results of all tasks.
+
+        Args:
+            allow_missing (bool, optional): whether unfinished or failed
+                                            tasks are left out instead of
+                                            raising an error.
+                                            Defaults to False.
+
+        Raises:
+            ValueError: if a task has no result and allow_missing is False.
+
+        Returns:
+            dict: statistics returned by AgentBasedSim.dump_stats, by
+                  (scenario, replication) positions.
+        """
+        results = {}
+        for task_id in self.tasks():
+            path = self._path('results', task_id)
+            if not os.path.exists(path):
+                if allow_missing:
+                    continue
+                raise ValueError('Task {} has no result.'.format(task_id))
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            results[(result['scenario'], result['replication'])] = \
+                result['stats']
+        return results
+
+    def _claim_next(self, worker_id: str) -> str:
+        for task_id in self.tasks():
+            if os.path.exists(self._path('results', task_id)) or \
+                    os.path.exists(self._path('failed', task_id, '.txt')):
+                continue
+            if self._claim(task_id, worker_id):
+                # The task may have finished since it was listed
+                if os.path.exists(self._path('results', task_id)):
+                    self._release(self._path('leases', task_id, '.lease'))
+                    continue
+                return task_id
+        return None
+
+    def _claim(self, task_id: str, worker_id: str) -> bool:
+        lease = self._path('leases', task_id, '.lease')
+        if os.path.exists(lease):
+            if not self._is_stale(lease):
+                return False
+            # Only one worker manages to move a stale lease away
+            moved = '{}.{}.stale'.format(lease, worker_id)
+            try:
+                os.rename(lease, moved)
+            except OSError:
+                return False
+            # Another worker may have taken over the stale lease and
+            # created a fresh one before the rename: put it back
+            if not self._is_stale(moved):
+                try:
+                    os.link(moved, lease)
+                except OSError:
+                    pass
+                os.remove(moved)
+                return False
+            os.remove(moved)
+        try:
+            fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(worker_id)
+        return True
+
+    def _is_stale(self, lease: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(lease) > \
+                self.lease_timeout
+        except OSError:
+            return False
+
+    def _heartbeat(self, lease: str, stop: threading.Event):
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                os.utime(lease)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _release(lease: str):
+        try:
+            os.remove(lease)
+        except OSError:
+            pass
+
+    def _path(self, folder: str, task_id: str, extension: str = '.pkl'
+              ) -> str:
+        return os.path.join(self.directory, folder, task_id + extension)
+
+    @staticmethod
+    def _write(path: str, obj: Any):
+        temporary = '{}.{}-{}.tmp'.format(path, socket.gethostname(),
+                                          os.getpid())
+        with open(temporary, 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(temporary, path)
+
+
+def seed_globals(seeds: dict):
+    """ Seeds python's and numpy's global generators from a seeds
+    dictionary, so that code relying on them (i.e. igraph's random graphs
+    or np.random calls in user events) is reproducible.
+
+    Args:
+        seeds (dict): seeds dictionary, as given to AgentBasedSim.run.
+    """
+    entropy = [int(seeds[key]) for key in sorted(seeds.keys())]
+    state = np.random.SeedSequence(entropy).generate_state(2)
+    random.seed(int(state[0]))
+    np.random.seed(int(state[1]))
+
+
+def run_replication(scenario_factory: Callable[..., AgentBasedSim],
+                    stop_time: Union[float, int], seeds: dict,
+                    verbose: bool = False,
+                    shared: Union[SharedScenario, dict] = None,
+                    **run_kwargs) -> dict:
+    """ Builds a simulation through a scenario factory, runs it and
+    returns its statistics.
+
+    Args:
+        scenario_factory (callable): function returning an AgentBasedSim
+                                     object.
+        stop_time (float): simulation stopping time.
+        seeds (dict): seeds dictionary, as given to AgentBasedSim.run.
+        verbose (bool, optional): parameter used to activate the printing
+                                  across the simulation. Defaults to False.
+        shared (SharedScenario or dict, optional): scenario, or handle of a
+                                                   published scenario,
+                                                   passed to the factory.
+                                                   Defaults to None.
+
+    Returns:
+        dict: statistics returned by AgentBasedSim.dump_stats.
+    """
+    seed_globals(seeds)
+    if shared is None:
+        sim = scenario_factory()
+    else:
+        if isinstance(shared, dict):
+            shared = attach_shared(shared)
+        sim = scenario_factory(shared)
+    sim.run(stop_time, seeds=dict(seeds), verbose=verbose, **run_kwargs)
+    return sim.dump_stats()
@@ -0,0 +1,206 @@
+from typing import Any, Dict, Iterator, List, Tuple
+import json
+import os
+import numpy as np
+
+
+class ResultsArchive:
+    """ Class used to store the statistics of many replications of many
+    scenarios, and read them back lazily. Results are organized by
+    scenario, replication and series (label of a statistic): each
+    replication is a compressed npz file with one array per series, in
+    the directory of its scenario, so a reader only decompresses the
+    series and replications it requests.
+
+    Files are written to a temporary name and renamed, so several
+    processes (i.e. ReplicationRunner or FileQueue workers) can write to
+    the same archive.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory (str): directory of the archive. It is created if it
+                             does not exist.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def write(self, scenario: str, replication: int, stats: Dict[str, Any],
+              params: dict = None):
+        """ Method used to store the statistics of a replication.
+
+        Args:
+            scenario (str): name of the scenario.
+            replication (int): index of the replication.
+            stats (dict): collected values by series, as returned by
+                          AgentBasedSim.dump_stats.
+            params (dict, optional): parameters of the scenario, stored as
+                                     JSON once per scenario.
+                                     Defaults to None.
+        """
+        folder = os.path.join(self.directory, str(scenario))
+        os.makedirs(folder, exist_ok=True)
+        if params is not None:
+            self._replace(os.path.join(folder, 'scenario.json'),
+                          lambda f: f.write(json.dumps(params).encode()))
+        arrays = {label: np.asarray(values) for label, values in
+                  stats.items()}
+        self._replace(self._path(scenario, replication),
+                      lambda f: np.savez_compressed(f, **arrays))
+
+    def scenarios(self) -> List[str]:
+        """ Method used to list the scenarios of the archive.
+
+        Returns:
+            list: sorted scenario names.
+        """
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.isdir(os.path.join(self.directory, name)))
+
+    def params(self, scenario: str) -> dict:
+        """ Method used to get the parameters of a scenario.
+
+        Args:
+            scenario (str): name of the scenario.
+
+        Returns:
+            dict: parameters, or None if they were not stored.
+        """
+        path = os.path.join(self.directory, str(scenario), 'scenario.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def replications(self, scenario: str) -> List[int]:
+        """ Method used to list the replications of a scenario.
+
+        Args:
+            scenario (str): name of the scenario.
+
+        Returns:
+            list: sorted replication indexes.
+        """
+        folder = os.path.join(self.directory, str(scenario))
+        return sorted(int(name[:-4]) for name in os.listdir(folder)
+                      if name.endswith('.npz'))
+
+    def series(self, scenario: str, replication: int = None) -> List[str]:
+        """ Method used to list the series of a replication, without
+        reading them.
+
+        Args:
+            scenario (str): name of the scenario.
+            replication (int, optional): index of the replication.
+                                         Defaults to the first one.
+
+        Returns:
+            list: labels of the series.
+        """
+        if replication is None:
+            replication = self.replications(scenario)[0]
+        with np.load(self._path(scenario, replication)) as data:
+            return list(data.files)
+
+    def iter_series(self, scenario: str, label: str,
+                    replications: List[int] = None
+                    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """ Method used to read a series replication by replication, so only
+        one replication is in memory at a time.
+
+        Args:
+            scenario (str): name of the scenario.
+            label (str): label of the series.
+            replications (list, optional): replications to read. Defaults to
+                                           all replications.
+
+        Yields:
+            (int, numpy.Array): index of the replication and its values.
+        """
+        if replications is None:
+            replications = self.replications(scenario)
+        for replication in replications:
+            with np.load(self._path(scenario, replication)) as data:
+                yield replication, data[label]
+
+    def load(self, scenario: str, label: str,
+             replications: List[int] = None) -> np.ndarray:
+        """ Method used to read a series of several replications into an
+        array. Replications with fewer values (i.e. stopped early) are
+        padded with nan.
+
+        Args:
+            scenario (str): name of the scenario.
+            label (str): label of the series.
+            replications (list, optional): replications to read. Defaults to
+                                           all replications.
+
+        Returns:
+            numpy.Array: array with one row per replication.
+        """
+        values = [v for _, v in self.iter_series(scenario, label,
+                                                 replications)]
+        length = max((len(v) for v in values), default=0)
+        if all(len(v) == length for v in values):
+            return np.stack(values) if values else np.empty((0, 0))
+        out = np.full((len(values), length) + values[0].shape[1:], np.nan)
+        for i, v in enumerate(values):
+            out[i, :len(v)] = v
+        return out
+
+    def ensemble(self, scenario: str, label: str,
+                 replications: List[int] = None) -> Dict[str, np.ndarray]:
+        """ Method used to compute statistics of a series across
+        replications in one pass, reading one replication at a time
+        (Welford's algorithm). Each position of the series only considers
+        the replications that reached it.
+
+        Args:
+            scenario (str): name of the scenario.
+            label (str): label of the series.
+            replications (list, optional): replications to use. Defaults to
+                                           all replications.
+
+        Returns:
+            dict: 'count', 'mean', 'std' (sample standard deviation), 'min'
+                  and 'max' arrays.
+        """
+        count = mean = m2 = low = high = None
+        for _, values in self.iter_series(scenario, label, replications):
+            values = np.asarray(values, dtype=float)
+            if count is None:
+                shape = values.shape
+                count, mean, m2 = (np.zeros(shape), np.zeros(shape),
+                                   np.zeros(shape))
+                low, high = np.full(shape, np.inf), np.full(shape, -np.inf)
+            if len(values) > len(count):
+                extra = (len(values) - len(count),) + count.shape[1:]
+                count, mean, m2 = (np.concatenate([a, np.zeros(extra)])
+                                   for a in (count, mean, m2))
+                low = np.concatenate([low, np.full(extra, np.inf)])
+                high = np.concatenate([high, np.full(extra, -np.inf)])
+            n = len(values)
+            count[:n] += 1
+            delta = values - mean[:n]
+            mean[:n] += delta/count[:n]
+            m2[:n] += delta*(values - mean[:n])
+            low[:n] = np.minimum(low[:n], values)
+            high[:n] = np.maximum(high[:n], values)
+        if count is None:
+            return {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(m2/(count - 1))
+        return {'count': count, 'mean': mean, 'std': std,
+                'min': low, 'max': high}
+
+    def _path(self, scenario: str, replication: int) -> str:
+        return os.path.join(self.directory, str(scenario),
+                            '{:06d}.npz'.format(replication))
+
+    @staticmethod
+    def _replace(path: str, write: Any):
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'wb') as f:
+            write(f)
+        os.replace(temporary, path)
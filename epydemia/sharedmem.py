@@ -0,0 +1,133 @@
+from . import Population
+from typing import List
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class SharedScenario:
+    """ Class used to share the static parts of a scenario (read-only
+    population attributes and the edges of each network layer) between
+    processes. The publishing process copies each array once into a
+    block of shared memory, and worker processes attach to the blocks
+    using a small picklable handle, getting read-only numpy views without
+    copies.
+
+    Mutable state (disease states, interventions attributes and edge
+    transmission probabilities) is not shared: each worker creates its
+    own when building the simulation. Note that igraph copies the edges
+    into its own structure when a layer is built from them, so only
+    parsing the network files (or unpickling graphs) is avoided for
+    layers.
+    """
+
+    def __init__(self, handle: dict, blocks: dict, owner: bool):
+        """ SharedScenario objects are created with the publish and attach
+        methods.
+
+        Args:
+            handle (dict): description of the shared blocks.
+            blocks (dict): shared memory blocks by array name.
+            owner (bool): whether this object created the blocks.
+        """
+        self.handle = handle
+        self.blocks = blocks
+        self.owner = owner
+        self.size = handle['size']
+        self.columns = {label: self._view('column/' + label)
+                        for label in handle['columns']}
+        self.edges = {label: self._view('layer/' + label)
+                      for label in handle['layers']}
+
+    @classmethod
+    def publish(cls, population: Population,
+                columns: List[str]) -> 'SharedScenario':
+        """ Method used to copy the static parts of a population into
+        shared memory. Columns must be given explicitly, since shared
+        columns are read-only in workers: attributes modified during the
+        simulation (i.e. by interventions) must not be shared.
+
+        Args:
+            population (Population): population to share.
+            columns (list): labels of the read-only attributes to share.
+
+        Returns:
+            SharedScenario: owner of the shared blocks. The handle
+                            attribute is passed to workers to attach.
+        """
+        arrays = {'column/' + label: np.asarray(population[label])
+                  for label in columns}
+        layers = []
+        for label, layer in population.network.layers.items():
+            arrays['layer/' + label] = np.array(
+                layer.graph.get_edgelist(), dtype=np.int32).reshape(-1, 2)
+            layers.append(label)
+        handle = {'size': population.size, 'columns': list(columns),
+                  'layers': layers, 'arrays': {}}
+        blocks = {}
+        for name, values in arrays.items():
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype,
+                       buffer=block.buf)[...] = values
+            blocks[name] = block
+            handle['arrays'][name] = (block.name, values.dtype.str,
+                                      values.shape)
+        return cls(handle, blocks, owner=True)
+
+    @classmethod
+    def attach(cls, handle: dict) -> 'SharedScenario':
+        """ Method used to attach to blocks published by another process.
+
+        Args:
+            handle (dict): handle of the published scenario.
+
+        Returns:
+            SharedScenario: scenario with read-only views of the blocks.
+        """
+        blocks = {}
+        for name, (block_name, _, _) in handle['arrays'].items():
+            blocks[name] = shared_memory.SharedMemory(name=block_name)
+        return cls(handle, blocks, owner=False)
+
+    def close(self):
+        """ Method used to release the blocks. If this object published
+        them, they are also destroyed, so it must be called after all
+        workers are done.
+        """
+        self.columns, self.edges = {}, {}
+        for block in self.blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # Views are still referenced (i.e. by a population)
+                pass
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+    def _view(self, name: str) -> np.ndarray:
+        _, dtype, shape = self.handle['arrays'][name]
+        view = np.ndarray(tuple(shape), dtype=np.dtype(dtype),
+                          buffer=self.blocks[name].buf)
+        view.flags.writeable = False
+        return view
+
+
+_ATTACHED = {}
+
+
+def attach_shared(handle: dict) -> SharedScenario:
+    """ Attaches to a published scenario once per process, reusing the
+    attached scenario for later calls with the same handle.
+
+    Args:
+        handle (dict): handle of the published scenario.
+
+    Returns:
+        SharedScenario: attached scenario.
+    """
+    key = tuple(sorted((name, spec[0])
+                       for name, spec in handle['arrays'].items()))
+    if key not in _ATTACHED:
+        _ATTACHED[key] = SharedScenario.attach(handle)
+    return _ATTACHED[key]
@@ -14,8 +14,14 @@ class Step(Event):
 
     An example of a discrete daily step is given by the SampleDailyStep
     class defined in the special_events module.
+
+    Steps do not create infections by themselves when no agent is
+    infectious, so they can be skipped while the simulation is quiescent
+    (see AgentBasedSim.run).
     """
 
+    creates_infections = False
+
     def __init__(self, time: Union[float, int], simulator: Simulator):
         """ As the Step class inherits from the Event class, it requires
         an event time and a simulator object. This method can be
@@ -4,6 +4,7 @@ import igraph as ig
 import numpy as np
 import random
 from . import dict_to_csv
+from . import TransitionLog, Stratifier, ColumnStore
 from . import AbstractLayer, AbstractNetwork, AbstractDisease
 
 class Population(SubsObject):
@@ -13,12 +14,25 @@ class Population(SubsObject):
     class is also used to handle agent's attributes related with diseases,
     and handles the updating of tranmission probabilities in the network.
 
-    It is assumed that the population remains constant during the simulation.
-    However, a time-varying size can be implemented by modifying arrays
-    accordingly.
+    The population can change during the simulation (births, deaths,
+    migration). Agents that leave the population free their slot (index),
+    which is kept in a free list and reused by agents that join later.
+    Arrays only grow when no free slots are left, doubling their capacity
+    so that growth is amortized. Empty slots have a disease state of -1
+    and no edges in the network.
+
+    Every change of disease state is recorded in a TransitionLog, which
+    can be used to rebuild compartment counts or agents' states at any
+    time without storing copies of the states arrays.
+
+    For very large populations, attributes can be backed by memory-mapped
+    files in a storage directory (see ColumnStore). Memory-mapped columns
+    are accessed and modified as any other attribute.
     """
 
-    def __init__(self, population_size: int, attributes: dict[str, Any] = {}, **network_kwargs):
+    def __init__(self, population_size: int, attributes: dict[str, Any] = {},
+                 log_transitions: bool = True, storage_dir: str = None,
+                 **network_kwargs):
         """ When initializing a Population object, a population size
         is needed. Any desired attributes must be given initially as
         a dictionary, where keys are an attribute's name and attribute
@@ -32,11 +46,29 @@ class Population(SubsObject):
             population_size (int): size of the population.
             attributes (dict, optional): dictionary with population
                                          attributes. Defaults to dict().
+            log_transitions (bool, optional): whether to record changes of
+                                              disease states in the
+                                              transitions log.
+                                              Defaults to True.
+            storage_dir (str, optional): directory where array attributes
+                                         are stored as memory-mapped
+                                         columns. If not given, attributes
+                                         are kept in memory.
+                                         Defaults to None.
         """
+        self.size = population_size
+        self.store = None if storage_dir is None else ColumnStore(storage_dir)
         super().__init__(attributes=attributes)
         self.network = Network(**network_kwargs)
-        self.size = population_size
         self.diseases = {}
+        self.metadata = {}
+        self.disease_ids = {}
+        self.initial_states = {}
+        self.log_transitions = log_transitions
+        self.transitions = TransitionLog()
+        self.alive = np.ones(population_size, dtype=bool)
+        self.free_slots = []
+        self.stratifiers = {}
 
     def add_attribute(self, attribute_label: str,
                       values: Any):
@@ -48,7 +80,7 @@ class Population(SubsObject):
             attribute_label (str): label to access the attribute.
             values (numpy.Array): attribute values.
         """
-        if type(values) in [list, np.ndarray]:
+        if isinstance(values, (list, np.ndarray)):
             try:
                 assert(len(values) == self.size)
             except AssertionError:
@@ -57,6 +89,64 @@ class Population(SubsObject):
                     .format(values.shape, self.size))
         self[attribute_label] = values
 
+    def __setitem__(self, key: str, newvalue: Any):
+        """Override of magic method. If the population uses a storage
+        directory, arrays are saved as memory-mapped columns. Assigning
+        an array to an existing writable memory-mapped column updates the
+        column in place when the array has the column's shape and can be
+        cast to its dtype, otherwise the column is replaced.
+
+        Args:
+            key (str): attribute's key
+            newvalue (Any): attribute object
+        """
+        current = self.attributes.get(key)
+        if isinstance(current, np.memmap) and current.flags.writeable and \
+                np.shape(newvalue) == current.shape and \
+                np.can_cast(np.asarray(newvalue).dtype, current.dtype,
+                            'same_kind'):
+            current[...] = newvalue
+        elif self.store is not None and ColumnStore.supports(newvalue):
+            self.attributes[key] = self.store.create(key, newvalue)
+        else:
+            self.attributes[key] = newvalue
+
+    @classmethod
+    def from_storage(cls, directory: str, labels: List[str] = None,
+                     mode: str = 'r', storage_dir: str = None,
+                     **kwargs) -> 'Population':
+        """ Method used to create a population attached to columns
+        previously stored in a directory. Columns are mapped into memory
+        and not copied, so several processes can share the same on-disk
+        population.
+
+        Args:
+            directory (str): directory with stored columns.
+            labels (list, optional): labels of the columns to attach.
+                                     Defaults to all columns.
+            mode (str, optional): numpy.memmap mode used to attach
+                                  columns. Use 'r' for read-only shared
+                                  columns or 'c' for copy-on-write
+                                  columns. Defaults to 'r'.
+            storage_dir (str, optional): directory where new attributes
+                                         (i.e. disease states) are
+                                         stored. If not given, new
+                                         attributes are kept in memory.
+                                         Defaults to None.
+
+        Returns:
+            Population: population object.
+        """
+        shared = ColumnStore(directory, mode=mode)
+        if labels is None:
+            labels = shared.labels()
+        columns = {label: shared.open(label) for label in labels}
+        population = cls(len(next(iter(columns.values()))),
+                         storage_dir=storage_dir, **kwargs)
+        for label, column in columns.items():
+            population.attributes[label] = column
+        return population
+
     def introduce_disease(self, disease: AbstractDisease, states_seed: int = None,
                           initial_state: str = 'susceptible'):
         """ Method used to introduce a disease in the population. It creates
@@ -86,6 +176,7 @@ class Population(SubsObject):
 
         # Create data structure
         self.diseases[disease.label] = disease
+        self.disease_ids[disease.label] = len(self.disease_ids)
         self[disease.label] = {}
 
         # Initialize states based on seed or an initial state
@@ -100,6 +191,7 @@ class Population(SubsObject):
             assert(len(states_seed) == self.size)
             self[disease.label] = \
                 np.array([disease.state_id(s) for s in states_seed])
+        self.initial_states[disease.label] = self[disease.label].copy()
 
         # Add probability of infection to the network
         for layer_label in self.network.layers.keys():
@@ -241,14 +333,243 @@ class Population(SubsObject):
     def change_state(self, idx: Union[int, List[int]], disease_label: str,
                      state_label: str):
         """ Method used to change the disease state of a subset of agents.
+        Agents whose state actually changes are recorded in the
+        transitions log, using the current time of the disease's simulator.
 
         Args:
             idx (list or numpy.Array): list of indices of target agents.
             disease_name (str): name of the disease.
             state_name (str): state to change to.
         """
-        self[disease_label][idx] = \
-            self.disease_state_id(disease_label, state_label)
+        state_id = self.disease_state_id(disease_label, state_label)
+        stratifiers = self.stratifiers.get(disease_label, {})
+        # Repeated agents change state once
+        idx = np.unique(np.asarray(idx, dtype=np.intp).ravel())
+        if len(idx) == 0:
+            return
+        if self.log_transitions or stratifiers:
+            from_states = self[disease_label][idx]
+            changed = from_states != state_id
+            idx, from_states = idx[changed], from_states[changed]
+            if self.log_transitions:
+                self.transitions.append(
+                    self.diseases[disease_label].simulator.now(), idx,
+                    self.disease_ids[disease_label], from_states, state_id)
+            for stratifier in stratifiers.values():
+                stratifier.update(idx, from_states, state_id)
+        self[disease_label][idx] = state_id
+
+    def add_stratifier(self, attribute_label: str, disease_label: str):
+        """ Method used to keep counts of agents in each state of a
+        disease for each category of an attribute (i.e. age group,
+        household, school or workplace). Counts are updated incrementally
+        when agents change state, and can be retrieved at any time using
+        the stratified_counts method.
+
+        Args:
+            attribute_label (str): label of a categorical attribute.
+            disease_label (str): label of the disease.
+
+        Raises:
+            KeyError: if disease has not been introduced.
+        """
+        try:
+            disease = self.diseases[disease_label]
+        except KeyError:
+            raise KeyError("Disease '{}' not found in population".format(
+                disease_label))
+        self.stratifiers.setdefault(disease_label, {})[attribute_label] = \
+            Stratifier(self[attribute_label], self[disease_label],
+                       len(disease['states']))
+
+    def stratified_counts(self, attribute_label: str,
+                          disease_label: str) -> Tuple[list, np.ndarray]:
+        """ Method used to retrieve the number of agents in each state of
+        a disease for each category of an attribute. A stratifier must be
+        added first using the add_stratifier method.
+
+        Args:
+            attribute_label (str): label of the attribute.
+            disease_label (str): label of the disease.
+
+        Returns:
+            (list, numpy.Array): category labels (None for missing values),
+                                 and a copy of the counts array of shape
+                                 (number of categories, number of states).
+        """
+        stratifier = self.stratifiers[disease_label][attribute_label]
+        return list(stratifier.labels), stratifier.counts.copy()
+
+    def state_counts(self, disease_label: str,
+                     times: Union[List[float], np.ndarray]) -> np.ndarray:
+        """ Method used to rebuild the number of agents in each disease
+        state at a sequence of times (i.e. daily compartment counts) from
+        the transitions log.
+
+        Args:
+            disease_label (str): label of the disease.
+            times (list): sorted sequence of times.
+
+        Returns:
+            numpy.Array: array of shape (len(times), number of states),
+                         where columns follow the disease's state ids.
+        """
+        return self.transitions.counts(
+            self.disease_ids[disease_label],
+            self.initial_states[disease_label],
+            len(self.diseases[disease_label]['states']), times)
+
+    def states_at(self, disease_label: str,
+                  time: Union[int, float]) -> np.ndarray:
+        """ Method used to rebuild the agents' disease states at a given
+        time from the transitions log.
+
+        Args:
+            disease_label (str): label of the disease.
+            time (float): target time.
+
+        Returns:
+            numpy.Array: agents' state ids.
+        """
+        initial_states = self.initial_states[disease_label]
+        if len(initial_states) < self.size:
+            initial_states = np.concatenate(
+                [initial_states,
+                 np.full(self.size - len(initial_states), -1,
+                         dtype=initial_states.dtype)])
+        return self.transitions.states_at(
+            self.disease_ids[disease_label], initial_states, time)
+
+    def add_agents(self, n: int, attributes: dict[str, Any] = {},
+                   initial_states: dict[str, str] = {}) -> np.ndarray:
+        """ Method used to add agents to the population (i.e. births or
+        immigration). Agents take free slots first, and the population
+        arrays are grown when there are not enough free slots.
+        Connections of new agents can be created using the connect method.
+
+        Args:
+            n (int): number of agents to add.
+            attributes (dict, optional): attribute values of new agents,
+                                         where keys are attribute labels
+                                         and values are arrays of size n.
+                                         Attributes not given are set to 0.
+                                         Defaults to {}.
+            initial_states (dict, optional): initial state label of new
+                                             agents for each disease.
+                                             Defaults to 'susceptible'.
+
+        Returns:
+            numpy.Array: indices of the new agents.
+        """
+        if len(self.free_slots) < n:
+            self._grow(n - len(self.free_slots))
+        slots = np.array(self.free_slots[-n:] if n > 0 else [], dtype=int)
+        del self.free_slots[len(self.free_slots) - n:]
+        for key, values in attributes.items():
+            self[key][slots] = values
+        for stratifiers in self.stratifiers.values():
+            for attribute_label, stratifier in stratifiers.items():
+                stratifier.assign(slots, self[attribute_label][slots])
+        for disease_label in self.diseases.keys():
+            self.change_state(slots, disease_label,
+                              initial_states.get(disease_label,
+                                                 'susceptible'))
+        self.alive[slots] = True
+        return slots
+
+    def remove_agents(self, idx: Union[int, List[int]]):
+        """ Method used to remove agents from the population (i.e. deaths
+        or emigration). Their disease states are set to -1, their other
+        attributes to an empty value (see _empty_value), their edges are
+        removed from all layers and their slots are freed to be reused by
+        new agents.
+
+        Args:
+            idx (list or numpy.Array): indices of the agents to remove.
+        """
+        idx = np.atleast_1d(idx)
+        idx = np.unique(idx[self.alive[idx]])
+        for disease_label in self.diseases.keys():
+            if self.log_transitions:
+                self.transitions.append(
+                    self.diseases[disease_label].simulator.now(), idx,
+                    self.disease_ids[disease_label],
+                    self[disease_label][idx], -1)
+            for stratifier in self.stratifiers.get(disease_label,
+                                                   {}).values():
+                stratifier.update(idx, self[disease_label][idx], -1)
+            self[disease_label][idx] = -1
+        for key, values in list(self.attributes.items()):
+            if key in self.diseases or not isinstance(values, np.ndarray) \
+                    or values.ndim == 0 or len(values) != self.size:
+                continue
+            if not values.flags.writeable:
+                self[key] = values = np.array(values)
+            values[idx] = self._empty_value(key, values)
+        self.network.remove_vertex_edges(idx)
+        self.alive[idx] = False
+        self.free_slots.extend(idx[::-1].tolist())
+
+    def connect(self, layer_label: str, edges: List[Tuple[int, int]]):
+        """ Method used to add contacts to a layer of the network. The
+        transmission probabilities of new edges are computed for all
+        diseases.
+
+        Args:
+            layer_label (str): label of the layer.
+            edges (list): list of (source, target) tuples.
+        """
+        edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+        edge_seq = self.network.add_edges(layer_label, edges)
+        for disease_label, disease in self.diseases.items():
+            self.network.add_attributes_edges(
+                layer_label, disease_label,
+                disease.compute_transmission_probabilities(edges.tolist()),
+                edge_seq=edge_seq)
+
+    def live_agents(self) -> np.ndarray:
+        """ Method used to get the indices of agents currently in the
+        population.
+
+        Returns:
+            numpy.Array: indices of live agents.
+        """
+        return np.where(self.alive)[0]
+
+    def _grow(self, n: int):
+        """ Method used to increase the number of slots in the population
+        by at least n. Capacity is at least doubled, and all population
+        arrays and network layers are extended accordingly.
+
+        Args:
+            n (int): minimum number of slots to add.
+        """
+        new_size = max(2*self.size, self.size + n)
+        extra = new_size - self.size
+        for key, values in list(self.attributes.items()):
+            if isinstance(values, np.ndarray) and values.ndim > 0 and \
+                    len(values) == self.size:
+                self[key] = np.concatenate(
+                    [values, np.full((extra,) + values.shape[1:],
+                                     self._empty_value(key, values),
+                                     dtype=values.dtype)])
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        self.network.add_vertices(extra)
+        self.free_slots.extend(range(new_size - 1, self.size - 1, -1))
+        self.size = new_size
+
+    def _empty_value(self, key: str, values: np.ndarray) -> Any:
+        """ Method used to get the value of an attribute in empty slots:
+        -1 for disease states, None for object columns (a missing value),
+        an empty string for string columns and 0 otherwise.
+        """
+        if key in self.diseases:
+            return -1
+        if values.dtype.kind == 'O':
+            return None
+        if values.dtype.kind in 'US':
+            return ''
+        return 0
 
     def update_transmission_probabilities(self,
                                           disease_labels: List[str] = None,
@@ -370,8 +691,9 @@ class Network(AbstractNetwork):
                   **kwargs):
         """ Method that adds a layer to the network through different ways.
         Implemented methods include creating random graphs using igraph's
-        built-in method such as barabasi, erdos_renyi or k_regular, or
-        by assigning a igraph object.
+        built-in method such as barabasi, erdos_renyi or k_regular, by
+        assigning a igraph object, or from an array of edges ('edges',
+        which requires the number of vertices n and an edges argument).
 
         Args:
             layer_name (str): layer name.
@@ -402,6 +724,9 @@ class Network(AbstractNetwork):
         elif how == 'file':
                 g = ig.Graph.Read_GraphML(filename)
                 self[layer_label] = Layer(label=layer_label, graph=g)
+        elif how == 'edges':
+            g = ig.Graph(n=kwargs['n'], edges=kwargs['edges'])
+            self[layer_label] = Layer(label=layer_label, graph=g)
         else:
             raise NotImplementedError('Method not implemented')
 
@@ -415,6 +740,44 @@ class Network(AbstractNetwork):
         #     self.neighborhood = {i: np.unique(
         #         np.concatenate([self.neighborhood_by_layer[layer][i] for layer in self.layers_labels])) for i in id_seq}
 
+    def add_vertices(self, n: int):
+        """ Method used to add vertices to all layers, so that all layers
+        keep the same number of vertices as the population.
+
+        Args:
+            n (int): number of vertices to add.
+        """
+        for layer in self.layers.values():
+            layer.graph.add_vertices(n)
+
+    def add_edges(self, layer_label: str,
+                  edges: List[Tuple[int, int]]) -> List[int]:
+        """ Method used to add edges to a layer.
+
+        Args:
+            layer_label (str): name of the layer.
+            edges (list): list of (source, target) tuples.
+
+        Returns:
+            list: indices of the new edges.
+        """
+        graph = self[layer_label].graph
+        n_edges = graph.ecount()
+        graph.add_edges(edges)
+        return list(range(n_edges, graph.ecount()))
+
+    def remove_vertex_edges(self, id_seq: List[int]):
+        """ Method used to remove all edges incident to a sequence of
+        vertices in all layers.
+
+        Args:
+            id_seq (list): list containing the indices of the vertices.
+        """
+        if len(id_seq) == 0:
+            return
+        for layer in self.layers.values():
+            layer.graph.delete_edges(layer.graph.es.select(_incident=list(id_seq)))
+
     def add_attributes_edges(self, layer_label: str, attr_label: str,
                              attrs: Union[list, np.ndarray],
                              edge_seq: List[int] = None):
@@ -495,18 +858,146 @@ class Network(AbstractNetwork):
 
 
 class StatsCollector(SubsObject):
+    """ Class used to collect statistics during the simulation. Values
+    are stored by label. By default, values are appended to python lists.
+    Labels can also be registered with a dtype and shape, in which case
+    values are written into preallocated numpy buffers that grow
+    geometrically, and are returned as arrays with one row per collection.
+
+    If a StatsSink is given, values of each label are handed to the sink
+    every flush_size collections and written to disk in the background,
+    so memory does not grow with the length of the simulation.
+    """
+
+    def __init__(self, attributes: dict = {}, sink: Any = None,
+                 flush_size: int = 1024):
+        """
+        Args:
+            attributes (dict, optional): dictionary with collected lists.
+                                         Defaults to {}.
+            sink (StatsSink, optional): sink used to stream values to disk.
+                                        Defaults to None.
+            flush_size (int, optional): number of values of a label kept in
+                                        memory before handing them to the
+                                        sink. Defaults to 1024.
+        """
+        super().__init__(attributes)
+        self.registry = {}
+        self.buffers = {}
+        self.counts = {}
+        self.sink = sink
+        self.flush_size = flush_size
+        self.last = {}
+        self.collected = set()
+
+    def register(self, label: str, dtype: Any = float, shape: tuple = (),
+                 capacity: int = 256):
+        """ Method used to register a label whose values are stored in a
+        preallocated numpy buffer.
+
+        Args:
+            label (str): label of the statistic.
+            dtype (Any, optional): numpy dtype of the values.
+                                   Defaults to float.
+            shape (tuple, optional): shape of each value, () for scalars.
+                                     Defaults to ().
+            capacity (int, optional): initial number of rows allocated.
+                                      Defaults to 256.
+        """
+        self.registry[label] = (np.dtype(dtype), tuple(shape),
+                                max(int(capacity), 1))
+        self._allocate(label)
 
     def collect(self, label: str, value: Any):
-        if label not in self.attributes.keys():
+        self.last[label] = value
+        self.collected.add(label)
+        if label in self.registry:
+            n = self.counts[label]
+            buffer = self.buffers[label]
+            if n == len(buffer):
+                buffer = np.concatenate([buffer, np.empty_like(buffer)])
+                self.buffers[label] = buffer
+            buffer[n] = value
+            self.counts[label] = n + 1
+            n = n + 1
+        elif label not in self.attributes.keys():
             self[label] = [value]
+            n = 1
         else:
             self[label].append(value)
+            n = len(self[label])
+        if self.sink is not None and n >= self.flush_size:
+            self._flush(label)
+
+    def repeat_last(self, label: str, n: int):
+        """ Method used to collect again the last value of a label.
+
+        Args:
+            label (str): label of the statistic.
+            n (int): number of times the value is collected.
+        """
+        for _ in range(n):
+            self.collect(label, self.last[label])
+
+    def flush(self):
+        """ Method used to hand all values in memory to the sink and wait
+        until they are written.
+        """
+        for label in list(self.attributes.keys()) + \
+                list(self.registry.keys()):
+            self._flush(label)
+        self.sink.flush()
+
+    def __getitem__(self, key: str) -> Any:
+        """Override of magic method. Registered labels return a view of
+        the collected rows.
+
+        Args:
+            key (str): label of the statistic.
+
+        Returns:
+            Any: list or numpy.Array with collected values.
+        """
+        if key in self.registry:
+            return self.buffers[key][:self.counts[key]]
+        return super().__getitem__(key)
 
     def clear(self):
+        """ Method used to remove all collected values. Registered labels
+        keep their registration and get new buffers, so arrays previously
+        returned are not modified.
+        """
         self.attributes = {}
+        self.last = {}
+        self.collected = set()
+        for label in self.registry.keys():
+            self._allocate(label)
 
     def dump(self, label: str):
         return self[label]
 
     def dump_all(self):
-        return self.attributes
+        if self.sink is not None:
+            self.flush()
+            return self.sink.manifest()
+        stats = dict(self.attributes)
+        for label in self.registry.keys():
+            stats[label] = self[label]
+        return stats
+
+    def _allocate(self, label: str):
+        dtype, shape, capacity = self.registry[label]
+        if self.sink is not None:
+            capacity = self.flush_size
+        self.buffers[label] = np.empty((capacity,) + shape, dtype=dtype)
+        self.counts[label] = 0
+
+    def _flush(self, label: str):
+        if label in self.registry:
+            if self.counts[label] > 0:
+                self.sink.write(label,
+                                self.buffers[label][:self.counts[label]])
+                self._allocate(label)
+        elif len(self.attributes[label]) > 0:
+            self.sink.write(label, self.attributes[label])
+            self.attributes[label] = []
@@ -1,13 +1,14 @@
 from . import Simulator, Stream
-from . import Population, StatsCollector
+from . import Population, StatsCollector, StatsSink
+from . import SharedScenario
+from . import CheckpointWriter, read_checkpoint
 from . import AbstractDisease
 from . import Intervention, Step
-from . import from_file_proportion
+from . import from_file_proportion, from_arrow, read_bundle
 import random
 import numpy as np
 import pandas as pd
 from typing import Type, Union, List
-from copy import deepcopy
 
 class AgentBasedSim(Simulator):
     """ Main simulation class. A AgentBasedSim object is used to handle
@@ -39,10 +40,21 @@ class AgentBasedSim(Simulator):
         self.step = StepCls
         self.streams = dict()
         self.stop_time = None
+        self.step_labels = set()
+        self.step_current = False
+        self.checkpoint_path = None
+        self.checkpoint_interval = None
+        self.next_checkpoint = None
+        self.checkpoint_writer = CheckpointWriter()
 
     def run(self, stop_time: Union[float, int],
             seeds: dict,
-            verbose: bool = True):
+            verbose: bool = True,
+            sink: StatsSink = None,
+            flush_size: int = 1024,
+            quiescence: str = None,
+            checkpoint_path: str = None,
+            checkpoint_interval: Union[float, int] = None):
         """ Method called to run the simulation. It can be override by
         the user to implement additional operations.
 
@@ -53,10 +65,71 @@ class AgentBasedSim(Simulator):
             verbose (bool, optional): parameter used to activate the printing
                                       across the simulation. Defaults to True.
             seeds (tuple, optional): _description_. Defaults to (1024,).
+            sink (StatsSink, optional): sink used to stream collected
+                                        statistics to disk. If given,
+                                        dump_stats returns the files
+                                        written for each label.
+                                        Defaults to None.
+            flush_size (int, optional): number of values of each statistic
+                                        kept in memory before writing
+                                        them to the sink. Defaults to 1024.
+            quiescence (str, optional): what to do once no agent is in an
+                                        infectious state of any disease
+                                        (see the 'infectious_states'
+                                        disease attribute):
+                                        - 'stop': stop the simulation if no
+                                          pending event can create
+                                          infections.
+                                        - 'fast_forward': skip steps until
+                                          the next event that is not a
+                                          step. Statistics collected by the
+                                          first step executed while
+                                          quiescent are repeated for each
+                                          skipped step.
+                                        Defaults to None, which executes
+                                        all steps.
+            checkpoint_path (str, optional): path where checkpoints are
+                                             periodically written (see the
+                                             checkpoint method).
+                                             Defaults to None.
+            checkpoint_interval (float, optional): simulation time between
+                                                   checkpoints. Checkpoints
+                                                   are written in the
+                                                   background.
+                                                   Defaults to None.
         """
+        self.setup(stop_time, seeds, verbose=verbose, sink=sink,
+                   flush_size=flush_size, quiescence=quiescence)
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.next_checkpoint = checkpoint_interval
+
+        # Run model
+        super().run(self.stop_time)
+        self.checkpoint_writer.wait()
+
+    def setup(self, stop_time: Union[float, int],
+              seeds: dict,
+              verbose: bool = True,
+              sink: StatsSink = None,
+              flush_size: int = 1024,
+              quiescence: str = None):
+        """ Method used to prepare the simulation before executing any
+        event: creates the statistics collector and the streams, and
+        initializes the diseases, the network and the step. It is called
+        by the run method, and takes the same arguments.
+        """
+        try:
+            assert quiescence in [None, 'stop', 'fast_forward']
+        except AssertionError:
+            raise ValueError('Quiescence must be None, \'stop\' or '
+                             '\'fast_forward\'.')
         self.verbose = verbose
-        self.collector = StatsCollector()
+        self.collector = StatsCollector(sink=sink, flush_size=flush_size)
         self.stop_time = stop_time
+        self.quiescence = quiescence
+        self.step_labels = set()
+        self.step_current = False
         
         # Setup diseases
         try:
@@ -77,16 +150,15 @@ class AgentBasedSim(Simulator):
 
         # Initialize main step
         self.step.initialize(self)
-        
-        # Run model
-        super().run(self.stop_time)
 
     def create_population(self, how: str = 'basic',
                           population_size: int = None,
                           population_random_seed: int = 3069,
                           network_random_seed: int = 2048,
                           pop_attributes: dict = dict(),
-                          filename: str = None, **network_kwargs):
+                          filename: str = None, columns: List[str] = None,
+                          categorical: List[str] = None,
+                          shared: SharedScenario = None, **network_kwargs):
         """ Method used to create a population. There are several ways
         on building one:
         - 'basic': creates a Population object of a desired size.
@@ -98,6 +170,18 @@ class AgentBasedSim(Simulator):
                             specifying attribute's name and possible
                             values.
         - 'from_csv': using a csv file where columns are attributes.
+        - 'parquet' or 'arrow': using a Parquet or Arrow IPC (Feather) file
+                                where columns are attributes. Only the
+                                selected columns are read, and string
+                                columns are mapped to integer codes (see
+                                Population.metadata).
+        - 'bundle': using a bundle file (see graphml_to_bundle), which
+                    holds population attributes and a layer per network
+                    layer. Attributes are read-only views of a memory map
+                    of the file.
+        - 'shared': using a SharedScenario published by another process.
+                    Shared attributes are read-only views of shared memory,
+                    and a layer is added for each shared layer.
 
         Args:
             how (str, optional): . Defaults to 'basic'.
@@ -118,6 +202,16 @@ class AgentBasedSim(Simulator):
             filename (str, optional): name of the file to read from. Required
                                       if how='proportion_file'.
                                       Defaults to None.
+            columns (list, optional): columns to read if how is 'parquet',
+                                      'arrow' or 'bundle'. Defaults to all
+                                      columns.
+            categorical (list, optional): additional columns to map to
+                                          integer codes if how is 'parquet'
+                                          or 'arrow'. Defaults to None.
+            shared (SharedScenario, optional): scenario attached to shared
+                                               memory. Required if
+                                               how='shared'.
+                                               Defaults to None.
 
         Raises:
             NotImplementedError
@@ -146,12 +240,41 @@ class AgentBasedSim(Simulator):
                 filename, population_size, stream)
             for key, value in pop_attributes.items():
                 self.population.add_attribute(key, value)
+            self.population.metadata = metadata
         elif how == 'from_csv':
             assert(isinstance(filename, str))
             df = pd.read_csv(filename)
             self.population = Population(population_size=len(df), **network_kwargs)
             for c, v in df.items():
                 self.population.add_attribute(c, v.values)
+        elif how in ['parquet', 'arrow']:
+            assert(isinstance(filename, str))
+            pop_attributes, metadata = from_arrow(
+                filename, columns=columns, categorical=categorical,
+                file_format=how)
+            population_size = len(next(iter(pop_attributes.values())))
+            self.population = Population(population_size, **network_kwargs)
+            for key, value in pop_attributes.items():
+                self.population.add_attribute(key, value)
+            self.population.metadata = metadata
+        elif how == 'bundle':
+            assert(isinstance(filename, str))
+            pop_attributes, layers, metadata = read_bundle(filename,
+                                                           columns=columns)
+            population_size = len(next(iter(pop_attributes.values())))
+            self.population = Population(population_size, **network_kwargs)
+            for key, value in pop_attributes.items():
+                self.population.add_attribute(key, value)
+            self.population.metadata = metadata
+            for layer_label, (n, edges) in layers.items():
+                self.add_layer(layer_label, how='edges', n=n, edges=edges)
+        elif how == 'shared':
+            assert(isinstance(shared, SharedScenario))
+            self.population = Population(shared.size, **network_kwargs)
+            for key, value in shared.columns.items():
+                self.population.add_attribute(key, value)
+            for layer_label, edges in shared.edges.items():
+                self.add_layer(layer_label, how='edges', edges=edges)
         else:
             raise NotImplementedError('Method not implemented')
 
@@ -210,7 +333,134 @@ class AgentBasedSim(Simulator):
             kwargs['n'] = self.population.size
         self.population.network.add_layer(layer_label=layer_label, **kwargs)
 
-    def dump_stats(self):
-        stats = deepcopy(self.collector.dump_all())
+    def dump_stats(self) -> dict:
+        """ Method used to retrieve all collected statistics and clear
+        the collector. Collected lists and arrays are handed over without
+        copies, as the collector starts new ones after being cleared.
+
+        Returns:
+            dict: collected statistics by label.
+        """
+        stats = self.collector.dump_all()
         self.collector.clear()
         return stats
+
+    def execute_next(self):
+        """ Method used to execute the next event. When quiescence is set,
+        the labels collected by each step are kept to fill the statistics
+        of skipped steps. Periodic checkpoints are requested after events.
+        """
+        if self.quiescence is not None and \
+                isinstance(self.events.next_event(), Step):
+            self.collector.collected = set()
+            super().execute_next()
+            self.step_labels = self.collector.collected
+            self.step_current = True
+        else:
+            super().execute_next()
+            self.step_current = False
+        if self.checkpoint_interval is not None and \
+                self.sim_time >= self.next_checkpoint:
+            while self.next_checkpoint <= self.sim_time:
+                self.next_checkpoint += self.checkpoint_interval
+            self.checkpoint(self.checkpoint_path, block=False)
+
+    def is_quiescent(self) -> bool:
+        """ Method used to check whether no agent is in an infectious state
+        of any disease.
+
+        Returns:
+            bool: whether all diseases are quiescent.
+        """
+        diseases = self.population.diseases.values()
+        return len(diseases) > 0 and all(disease.is_quiescent()
+                                         for disease in diseases)
+
+    def is_skippable(self, event: Step) -> bool:
+        """ Method used to check whether an event can be skipped while the
+        simulation is quiescent. Only steps are skipped, once a step has
+        been executed after the last event that was not a step, so the
+        statistics it collected describe the current state.
+
+        Args:
+            event (Event.object): event to check.
+
+        Returns:
+            bool: whether the event is a step.
+        """
+        return isinstance(event, Step) and self.step_current
+
+    def skip_events(self, events: List[Step]):
+        """ Method used to fill the statistics of skipped steps, which
+        repeat the values collected by the last executed step, as nothing
+        changes while the simulation is quiescent.
+
+        Args:
+            events (list): skipped steps.
+        """
+        for label in self.step_labels:
+            self.collector.repeat_last(label, len(events))
+
+    def checkpoint(self, path: str, block: bool = True):
+        """ Method used to save the state of a running simulation: pending
+        events, population (attributes, network layers and their edge
+        attributes), disease and other streams, collected statistics and
+        the state of python's and numpy's global generators. The state is
+        serialized before returning, and written to disk in the
+        background if block is False. Stop conditions are not saved, and
+        must be added again after restoring.
+
+        Args:
+            path (str): path to the checkpoint.
+            block (bool, optional): whether to wait until the checkpoint is
+                                    written. Defaults to True.
+        """
+        stop_conditions = self.stop_conditions
+        self.stop_conditions = []
+        try:
+            state = {'simulator': self, 'random': random.getstate(),
+                     'numpy': np.random.get_state()}
+            self.checkpoint_writer.save(path, state, block=block)
+        finally:
+            self.stop_conditions = stop_conditions
+
+    @classmethod
+    def restore(cls, path: str) -> 'AgentBasedSim':
+        """ Method used to load a simulation saved with checkpoint, and
+        restore python's and numpy's global generators. The simulation
+        continues with the resume method.
+
+        Args:
+            path (str): path to the checkpoint.
+
+        Returns:
+            AgentBasedSim: restored simulation.
+        """
+        state = read_checkpoint(path)
+        random.setstate(state['random'])
+        np.random.set_state(state['numpy'])
+        return state['simulator']
+
+    def resume(self, stop_time: Union[float, int] = None):
+        """ Method used to continue a restored simulation until its stopping
+        time, as run does.
+
+        Args:
+            stop_time (float, optional): new stopping time. Defaults to the
+                                         one given to run.
+        """
+        if stop_time is not None:
+            self.stop_time = stop_time
+        self.stopped = False
+        self.advance(self.stop_time)
+        self.events.clear()
+        self.checkpoint_writer.wait()
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state.pop('checkpoint_writer', None)
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.checkpoint_writer = CheckpointWriter()
@@ -0,0 +1,196 @@
+from abc import ABC, abstractmethod
+from typing import Any
+import os
+import queue
+import threading
+import numpy as np
+import pandas as pd
+
+
+class StatsSink(ABC):
+    """ Abstract class used to stream collected statistics to disk. Chunks
+    of values are handed to the sink by a StatsCollector and written to
+    files by a background thread, so the simulation does not wait for
+    disk I/O. The number of chunks waiting to be written is bounded by
+    max_pending: if the writer falls behind, the simulation waits until
+    a chunk is written, which keeps memory bounded.
+
+    Chunks are written to files named '<label>.<chunk index>.<extension>'
+    in the sink's directory.
+    """
+
+    EXTENSION = None
+
+    def __init__(self, directory: str, max_pending: int = 8):
+        """
+        Args:
+            directory (str): directory where chunks are written. It is
+                             created if it does not exist.
+            max_pending (int, optional): maximum number of chunks waiting
+                                         to be written. Defaults to 8.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.chunks = {}
+        self.error = None
+        self.thread = None
+
+    def write(self, label: str, values: Any):
+        """ Method used to schedule a chunk to be written. The sink takes
+        ownership of values, which must not be modified afterwards.
+
+        Args:
+            label (str): label of the statistic.
+            values (list or numpy.Array): chunk of collected values.
+        """
+        self._raise_error()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        paths = self.chunks.setdefault(label, [])
+        path = os.path.join(self.directory, '{}.{:06d}.{}'.format(
+            label, len(paths), self.EXTENSION))
+        paths.append(path)
+        self.queue.put((path, values))
+
+    def flush(self):
+        """ Method used to wait until all scheduled chunks are written.
+        """
+        if self.thread is not None:
+            self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        """ Method used to write all scheduled chunks and stop the
+        background thread.
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self._raise_error()
+
+    def manifest(self) -> dict:
+        """ Method used to get the files written for each label.
+
+        Returns:
+            dict: list of chunk files by label, in collection order.
+        """
+        return {label: list(paths) for label, paths in self.chunks.items()}
+
+    def load(self, label: str) -> np.ndarray:
+        """ Method used to read back all chunks of a label.
+
+        Args:
+            label (str): label of the statistic.
+
+        Returns:
+            numpy.Array: values concatenated along the first axis.
+        """
+        self.flush()
+        return np.concatenate([self.read_chunk(path)
+                               for path in self.chunks[label]])
+
+    @abstractmethod
+    def write_chunk(self, path: str, values: Any):
+        """ Method used to write a chunk to a file. Runs on the background
+        thread.
+
+        Args:
+            path (str): target file.
+            values (list or numpy.Array): chunk of values.
+        """
+        pass
+
+    @abstractmethod
+    def read_chunk(self, path: str) -> np.ndarray:
+        """ Method used to read a chunk from a file.
+
+        Args:
+            path (str): chunk file.
+
+        Returns:
+            numpy.Array: chunk values.
+        """
+        pass
+
+    def __getstate__(self) -> dict:
+        # Chunks are written before copying the sink (i.e. when saving a
+        # checkpoint), and a new thread is started when restored
+        self.flush()
+        state = dict(self.__dict__)
+        state['queue'] = self.queue.maxsize
+        state['thread'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.queue = queue.Queue(maxsize=state['queue'])
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    self.write_chunk(*item)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise IOError('Failed to write statistics') from error
+
+
+class NpzSink(StatsSink):
+    """ Sink that writes chunks as numpy .npz files.
+    """
+
+    EXTENSION = 'npz'
+
+    def write_chunk(self, path: str, values: Any):
+        np.savez(path, values=np.asarray(values))
+
+    def read_chunk(self, path: str) -> np.ndarray:
+        with np.load(path, allow_pickle=True) as f:
+            return f['values']
+
+
+class CsvSink(StatsSink):
+    """ Sink that writes chunks as csv files, with one row per collected
+    value.
+    """
+
+    EXTENSION = 'csv'
+
+    def write_chunk(self, path: str, values: Any):
+        values = np.asarray(values)
+        pd.DataFrame(values.reshape(len(values), -1)).to_csv(path,
+                                                            index=False)
+
+    def read_chunk(self, path: str) -> np.ndarray:
+        values = pd.read_csv(path).values
+        return values[:, 0] if values.shape[1] == 1 else values
+
+
+class ParquetSink(StatsSink):
+    """ Sink that writes chunks as Parquet files, with one row per
+    collected value. Requires pyarrow.
+    """
+
+    EXTENSION = 'parquet'
+
+    def write_chunk(self, path: str, values: Any):
+        values = np.asarray(values)
+        df = pd.DataFrame(values.reshape(len(values), -1))
+        df.columns = [str(c) for c in df.columns]
+        df.to_parquet(path, index=False)
+
+    def read_chunk(self, path: str) -> np.ndarray:
+        values = pd.read_parquet(path).values
+        return values[:, 0] if values.shape[1] == 1 else values
@@ -0,0 +1,135 @@
+import os
+import json
+import numpy as np
+from typing import Any, List
+
+
+class ColumnStore:
+    """ Class used to store population attributes as memory-mapped
+    columns in a directory. Each column is saved in its own raw binary
+    file, so that a column is a single contiguous block starting at a page
+    boundary. Scanning an attribute only touches the pages of that
+    attribute, and the operating system can share those pages between
+    processes that map the same file.
+
+    Column dtypes and shapes are stored in a metadata file (columns.json)
+    in the same directory, which allows other processes to attach the
+    columns without reading any data.
+    """
+
+    METADATA = 'columns.json'
+
+    def __init__(self, directory: str, mode: str = 'r+'):
+        """
+        Args:
+            directory (str): directory where columns are stored. It is
+                             created if it does not exist.
+            mode (str, optional): numpy.memmap mode used to open existing
+                                  columns. 'r' opens read-only columns,
+                                  'r+' opens shared writable columns and
+                                  'c' opens copy-on-write columns, where
+                                  changes are private to the process.
+                                  Defaults to 'r+'.
+        """
+        try:
+            assert mode in ['r', 'r+', 'c']
+        except AssertionError:
+            raise ValueError("Mode must be one of 'r', 'r+' or 'c'")
+        self.directory = directory
+        self.mode = mode
+        os.makedirs(directory, exist_ok=True)
+        self.columns = self._read_metadata()
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.columns
+
+    def labels(self) -> List[str]:
+        """ Method used to list the columns available in the store.
+
+        Returns:
+            list: column labels.
+        """
+        return list(self.columns.keys())
+
+    def path(self, label: str) -> str:
+        """ Method used to get the file holding a column.
+
+        Args:
+            label (str): column label.
+
+        Returns:
+            str: path to the column file.
+        """
+        return os.path.join(self.directory, '{}.bin'.format(label))
+
+    @staticmethod
+    def supports(values: Any) -> bool:
+        """ Method used to check if values can be stored as a
+        memory-mapped column. Object arrays (i.e. mixed python objects)
+        can not be memory-mapped.
+
+        Args:
+            values (Any): values to check.
+
+        Returns:
+            bool: True if values can be stored.
+        """
+        return isinstance(values, (list, np.ndarray)) and \
+            np.asarray(values).dtype.kind in 'biufcmMSUV'
+
+    def create(self, label: str, values: Any) -> np.memmap:
+        """ Method used to write a new column (or overwrite an existing
+        one) and map it into memory.
+
+        Args:
+            label (str): column label.
+            values (list or numpy.Array): column values.
+
+        Returns:
+            numpy.memmap: memory-mapped column.
+        """
+        values = np.asarray(values)
+        column = np.memmap(self.path(label), dtype=values.dtype, mode='w+',
+                           shape=values.shape)
+        column[...] = values
+        column.flush()
+        self.columns[label] = {'dtype': values.dtype.str,
+                               'shape': list(values.shape)}
+        self._write_metadata()
+        return self.open(label)
+
+    def open(self, label: str, mode: str = None) -> np.memmap:
+        """ Method used to map an existing column into memory.
+
+        Args:
+            label (str): column label.
+            mode (str, optional): numpy.memmap mode. Defaults to the
+                                  mode of the store.
+
+        Raises:
+            KeyError: if column is not found in the store.
+
+        Returns:
+            numpy.memmap: memory-mapped column.
+        """
+        try:
+            meta = self.columns[label]
+        except KeyError:
+            raise KeyError("Column '{}' not found in {}".format(
+                label, self.directory))
+        return np.memmap(self.path(label), dtype=np.dtype(meta['dtype']),
+                         mode=self.mode if mode is None else mode,
+                         shape=tuple(meta['shape']))
+
+    def _read_metadata(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, self.METADATA)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_metadata(self):
+        path = os.path.join(self.directory, self.METADATA)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.columns, f)
+        os.replace(path + '.tmp', path)
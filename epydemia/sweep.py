@@ -0,0 +1,187 @@
+from . import AgentBasedSim, Intervention, Step
+from . import seed_globals
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Type, Union
+from collections import OrderedDict
+from copy import deepcopy
+import itertools
+import random
+import numpy as np
+
+
+class ScenarioSweep:
+    """ Class used to simulate a grid of intervention scenarios (i.e.
+    masking start times, vaccination age targets and coverages) reusing
+    the simulation of the days the scenarios have in common.
+
+    A base scenario is built by a factory, which returns an AgentBasedSim
+    object without the swept interventions. A schedule function maps each
+    combination of parameters of the grid to the list of interventions of
+    the scenario, given as (InterventionCls, time, kwargs) tuples.
+
+    For each seeds dictionary, the base scenario is simulated once until
+    the first time at which scenarios schedule different interventions.
+    The simulation is then copied for each group of scenarios with the
+    same interventions at that time, and each copy continues until the
+    next divergence, so shared prefixes are simulated only once. Copies
+    of the simulation at each divergence (including the state of python's
+    and numpy's global generators) are kept in a cache, so later calls
+    to run with the same seeds reuse them.
+
+    Swept interventions are executed before the step scheduled at the
+    same time, as when they are added before running the simulation.
+    """
+
+    def __init__(self, scenario_factory: Callable[[], AgentBasedSim],
+                 stop_time: Union[float, int],
+                 grid: Dict[str, List[Any]],
+                 schedule: Callable[..., List[Tuple[Type[Intervention],
+                                                    Union[float, int],
+                                                    dict]]],
+                 cache_size: int = 32):
+        """
+        Args:
+            scenario_factory (callable): function returning the base
+                                         AgentBasedSim object.
+            stop_time (float): simulation stopping time.
+            grid (dict): list of values of each parameter.
+            schedule (callable): function receiving the parameters of a
+                                 scenario as keyword arguments, and
+                                 returning its list of interventions.
+            cache_size (int, optional): maximum number of simulation copies
+                                        kept in the cache. Defaults to 32.
+        """
+        self.scenario_factory = scenario_factory
+        self.stop_time = stop_time
+        self.parameters = [dict(zip(grid.keys(), values)) for values in
+                           itertools.product(*grid.values())]
+        self.schedules = []
+        for params in self.parameters:
+            interventions = sorted(schedule(**params),
+                                   key=lambda item: item[1])
+            self.schedules.append([(time, cls, kwargs)
+                                   for cls, time, kwargs in interventions])
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def run(self, seeds: List[dict], verbose: bool = False
+            ) -> Iterator[Tuple[int, int, dict]]:
+        """ Method used to simulate all scenarios for each seeds
+        dictionary.
+
+        Args:
+            seeds (list): list of seeds dictionaries, as given to
+                          AgentBasedSim.run.
+            verbose (bool, optional): parameter used to activate the
+                                      printing across the simulation.
+                                      Defaults to False.
+
+        Yields:
+            (int, int, dict): position of the scenario in parameters,
+                              position of the seeds dictionary, and the
+                              statistics returned by
+                              AgentBasedSim.dump_stats.
+        """
+        for j, replication_seeds in enumerate(seeds):
+            seed_key = tuple(sorted(replication_seeds.items()))
+            snapshot = self._get((seed_key, ()))
+            if snapshot is None:
+                seed_globals(replication_seeds)
+                sim = self.scenario_factory()
+                sim.setup(self.stop_time, dict(replication_seeds),
+                          verbose=verbose)
+                snapshot = self._put((seed_key, ()), sim)
+            scenarios = [(i, list(schedule))
+                         for i, schedule in enumerate(self.schedules)]
+            for i, stats in self._branch(self._restore(snapshot), scenarios,
+                                         seed_key, ()):
+                yield i, j, stats
+
+    def _branch(self, sim: AgentBasedSim, scenarios: List[Tuple[int, list]],
+                seed_key: tuple, prefix: tuple
+                ) -> Iterator[Tuple[int, dict]]:
+        """ Method used to simulate a group of scenarios that share the
+        simulation sim, which has executed all events before the first
+        pending intervention of the scenarios. The prefix identifies the
+        interventions scheduled and the times simulated so far.
+        """
+        heads = set(self._key(events[0]) if events else None
+                    for _, events in scenarios)
+
+        # All scenarios schedule the same intervention
+        if len(heads) == 1 and None not in heads:
+            event = scenarios[0][1][0]
+            self._schedule(sim, event)
+            yield from self._branch(sim, [(i, events[1:])
+                                          for i, events in scenarios],
+                                    seed_key, prefix + (self._key(event),))
+            return
+
+        # A single scenario (or no pending interventions) runs until end
+        if len(scenarios) == 1 or heads == {None}:
+            snapshot = self._snapshot(sim) if len(scenarios) > 1 else None
+            for n, (i, events) in enumerate(scenarios):
+                branch = sim if n == 0 else self._restore(snapshot)
+                for event in events:
+                    self._schedule(branch, event)
+                branch.advance(branch.stop_time)
+                branch.events.clear()
+                yield i, branch.dump_stats()
+            return
+
+        # Simulate the shared days once and branch at the first divergence
+        time = min(events[0][0] for _, events in scenarios if events)
+        prefix = prefix + (('advance', time),)
+        shared = self._get((seed_key, prefix))
+        if shared is None:
+            sim.advance(time, inclusive=False)
+            shared = self._put((seed_key, prefix), sim)
+        groups = OrderedDict()
+        for i, events in scenarios:
+            head = self._key(events[0]) \
+                if events and events[0][0] == time else None
+            groups.setdefault(head, []).append((i, events))
+        for head, group in groups.items():
+            branch = self._restore(shared)
+            branch_prefix = prefix
+            if head is not None:
+                self._schedule(branch, group[0][1][0])
+                branch_prefix = prefix + (head,)
+                group = [(i, events[1:]) for i, events in group]
+            yield from self._branch(branch, group, seed_key, branch_prefix)
+
+    def _schedule(self, sim: AgentBasedSim, event: tuple):
+        time, cls, kwargs = event
+        intervention = cls(time, sim, **kwargs)
+        sim.events.promote(intervention,
+                           condition=lambda e: isinstance(e, Step))
+
+    @staticmethod
+    def _key(event: tuple) -> tuple:
+        time, cls, kwargs = event
+        return (time, cls.__module__, cls.__qualname__,
+                repr(sorted(kwargs.items())))
+
+    @staticmethod
+    def _snapshot(sim: AgentBasedSim) -> tuple:
+        return (deepcopy(sim), random.getstate(), np.random.get_state())
+
+    @staticmethod
+    def _restore(snapshot: tuple) -> AgentBasedSim:
+        sim, python_state, numpy_state = snapshot
+        random.setstate(python_state)
+        np.random.set_state(numpy_state)
+        return deepcopy(sim)
+
+    def _get(self, key: tuple) -> tuple:
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        return None
+
+    def _put(self, key: tuple, sim: AgentBasedSim) -> tuple:
+        snapshot = self._snapshot(sim)
+        self.cache[key] = snapshot
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return snapshot
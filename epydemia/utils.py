@@ -64,6 +64,67 @@ def from_file_proportion(filename, sample_size, stream, prop_col='proportion'):
     return X, metadata
 
 
+def from_arrow(filename, columns=None, categorical=None,
+               file_format='parquet'):
+    """ Reads population attributes from a Parquet or Arrow IPC (Feather)
+    file. Only the requested columns are read. String columns, and any
+    column listed as categorical, are mapped to integer codes (-1 for
+    missing values). Numeric columns without missing values are returned
+    as read-only numpy views of the Arrow buffers, without copies.
+
+    Args:
+        filename (str): path to the file.
+        columns (list, optional): columns to read. Defaults to all columns.
+        categorical (list, optional): additional columns to map to integer
+                                      codes. Defaults to None.
+        file_format (str, optional): 'parquet' or 'arrow'.
+                                     Defaults to 'parquet'.
+
+    Returns:
+        (dict, dict): arrays by column, and mapping from category values to
+                      codes for each categorical column.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required to read '{}' files".format(file_format))
+
+    if file_format == 'parquet':
+        table = pq.read_table(filename, columns=columns, memory_map=True)
+    elif file_format == 'arrow':
+        table = pa.ipc.open_file(pa.memory_map(filename, 'r')).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    else:
+        raise NotImplementedError('Format not implemented')
+
+    categorical = set() if categorical is None else set(categorical)
+    X, metadata = {}, {}
+    for col, chunked in zip(table.column_names, table.columns):
+        if pa.types.is_string(chunked.type) or \
+                pa.types.is_large_string(chunked.type) or \
+                pa.types.is_dictionary(chunked.type) or col in categorical:
+            if not pa.types.is_dictionary(chunked.type):
+                chunked = pc.dictionary_encode(chunked)
+            chunked = chunked.unify_dictionaries()
+            dictionary = chunked.chunk(0).dictionary \
+                if chunked.num_chunks > 0 else pa.array([])
+            metadata[col] = {val: i for i, val in
+                             enumerate(dictionary.to_pylist())}
+            indices = pa.chunked_array(
+                [chunk.indices for chunk in chunked.chunks],
+                type=chunked.type.index_type)
+            chunked = pc.fill_null(indices, -1)
+        if chunked.num_chunks == 1 and chunked.null_count == 0:
+            X[col] = chunked.chunk(0).to_numpy(zero_copy_only=False)
+        else:
+            X[col] = chunked.to_numpy()
+    return X, metadata
+
+
 def dict_to_csv(dictionary, filename, **kwargs):
     df = pd.DataFrame.from_dict(dictionary, **kwargs)
     df.to_csv(filename)
@@ -6,16 +6,18 @@ class SusceptibleToExposed(ChangeState):
 
     def do(self):
         self.simulator.population.change_state(self.idx, 'covid', 'exposed')
-        time = 0.5 + self.simulator.population.diseases['covid'].stream.exponential(10)
+        time = 0.5 + self.simulator.population.diseases['covid'].stream.keyed_exponential(
+            10, self.idx, self.simulator.now(), 'incubation')[0]
         ExposedToInfected(self.simulator.now() + time,
                                 self.simulator, self.idx)
         if self.simulator.verbose:
             print('Agent {} became infected'.format(self.idx))
 
 class SusceptibleToRecovered(ChangeState):
+    creates_infections = False
 
     def do(self):
-        time = self.simulator.population.diseases['covid'].stream.gamma(25, 10)
+        time = self.simulator.population.diseases['covid'].stream.buffered('gamma', 25, 10)()
         self.simulator.population.change_state(self.idx, 'covid', 'recovered')
         if self.simulator.verbose:
             print('Agent {} got vaccinated'.format(self.idx))
@@ -25,7 +27,8 @@ class ExposedToInfected(ChangeState):
     def do(self):
         self.simulator.population.change_state(self.idx, 'covid',
                                                'infected')
-        time = self.simulator.population.diseases['covid'].stream.exponential(7)
+        time = self.simulator.population.diseases['covid'].stream.keyed_exponential(
+            7, self.idx, self.simulator.now(), 'recovery')[0]
         InfectedToRecovered(self.simulator.now() + time,
                                         self.simulator, self.idx)
         if self.simulator.verbose:
@@ -38,6 +41,7 @@ class ExposedToInfected(ChangeState):
 
 
 class InfectedToRecovered(ChangeState):
+    creates_infections = False
 
     def do(self):
         self.simulator.population.change_state(self.idx, 'covid', 'recovered')
@@ -59,7 +63,7 @@ class ImportCases(Event):
             susceptibles, size=self.cases, replace=False)
         self.simulator.population.change_state(idx, 'covid', 'infected')
         for person in idx:
-            time = self.simulator.population.diseases['covid'].stream.exponential(5)
+            time = self.simulator.population.diseases['covid'].stream.buffered('exponential', 5)()
             InfectedToRecovered(self.simulator.now() + time,
                                    self.simulator, person)
             if self.simulator.verbose:
@@ -72,6 +76,7 @@ class Covid(AbstractDisease):
         super().__init__('covid', simulator, infection_prob,
                          states, **attributes)
         self['initial_cases'] = initial_cases
+        self['infectious_states'] = ['infected']
 
     def initialize(self):
         ImportCases(0, self.simulator, self['initial_cases'])
@@ -79,8 +84,8 @@ class Covid(AbstractDisease):
     def infect(self):
         susceptibles, probability = self.population.get_transmission_probabilities(
             'covid', ['susceptible'], ['infected'])
-        exposed = susceptibles[np.where(
-            self.stream.random(len(probability)) <= probability)]
+        exposed = susceptibles[np.where(self.stream.keyed_random(
+            susceptibles, self.simulator.now(), 'infection') <= probability)]
         for person in exposed:
             SusceptibleToExposed(self.simulator.now(),
                                  self.simulator, person)
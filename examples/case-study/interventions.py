@@ -4,6 +4,7 @@ import numpy as np
 
 class RandomMasking(Intervention):
     '''docstring'''
+    creates_infections = False
 
     def do(self):
         if self.simulator.verbose:
@@ -20,6 +21,7 @@ class RandomMasking(Intervention):
 
 class Vaccination(Intervention):
     '''docstring'''
+    creates_infections = False
 
     def __init__(self, time, simulator,
                  age_target, coverage):
@@ -12,6 +12,8 @@ class DailyStep(Step):
 
     @classmethod
     def initialize(cls, simulator):
+        for name in ['susceptible', 'exposed', 'infected', 'recovered']:
+            simulator.collector.register(name, dtype=np.int64)
         for t in np.arange(0, int(simulator.stop_time)+1, DailyStep.STEP_SIZE):
             DailyStep(t, simulator)
 
@@ -27,9 +29,8 @@ class DailyStep(Step):
             stat = len(
                 np.where(self.simulator.population['covid'] == i)[0])
             self.simulator.collector.collect(name, stat)
-        self.simulator.collector.collect(
-            'states', self.simulator.population['covid'].copy()
-            )
+        # Daily states are not copied: use population.states_at to
+        # rebuild them from the transitions log.
         for label in ['masking', 'covid_vaccine']:
             try:
                 self.simulator.collector.collect(
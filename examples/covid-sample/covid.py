@@ -9,7 +9,7 @@ class SusceptibleToExposed(ChangeState):
 
     def do(self):
         self.population.change_state(self.idx, 'covid', 'exposed')
-        time = 0.5 + self.population.diseases['covid'].stream.weibull(4.6)
+        time = 0.5 + self.population.diseases['covid'].stream.buffered('weibull', 4.6)()
         ExposedToPresymptomatic(self.simulator.now() + time,
                                 self.simulator, self.idx)
         if self.simulator.verbose:
@@ -19,7 +19,7 @@ class SusceptibleToExposed(ChangeState):
 class SusceptibleToRecovered(ChangeState):
 
     def do(self):
-        time = self.population.diseases['covid'].stream.gamma(25, 10)
+        time = self.population.diseases['covid'].stream.buffered('gamma', 25, 10)()
         self.population.change_state(self.idx, 'covid', 'recovered')
         RecoveredToSusceptible(self.simulator.now() + time, self.simulator,
                                self.idx)
@@ -33,7 +33,7 @@ class ExposedToPresymptomatic(ChangeState):
         time = 0.5
         self.population.change_state(self.idx, 'covid',
                                                'presymptomatic')
-        if self.population.diseases['covid'].stream.random() < 1/3:
+        if self.population.diseases['covid'].stream.buffered('random')() < 1/3:
             PresymptomaticToSymptomatic(self.simulator.now() + time,
                                         self.simulator, self.idx)
         else:
@@ -46,9 +46,9 @@ class ExposedToPresymptomatic(ChangeState):
 class PresymptomaticToSymptomatic(ChangeState):
 
     def do(self):
-        time = self.population.diseases['covid'].stream.exponential(3)
+        time = self.population.diseases['covid'].stream.buffered('exponential', 3)()
         self.population.change_state(self.idx, 'covid', 'symptomatic')
-        if self.population.diseases['covid'].stream.random() < 0.03:
+        if self.population.diseases['covid'].stream.buffered('random')() < 0.03:
             SymptomaticToHospitalized(self.simulator.now() + time,
                                       self.simulator, self.idx)
         else:
@@ -61,9 +61,9 @@ class PresymptomaticToSymptomatic(ChangeState):
 class SymptomaticToHospitalized(ChangeState):
 
     def do(self):
-        time = self.population.diseases['covid'].stream.exponential(10.4)
+        time = self.population.diseases['covid'].stream.buffered('exponential', 10.4)()
         self.population.change_state(self.idx, 'covid', 'hospitalized')
-        if self.population.diseases['covid'].stream.random() < 0.2:
+        if self.population.diseases['covid'].stream.buffered('random')() < 0.2:
             HospitalizedToDeath(self.simulator.now() + time,
                                 self.simulator, self.idx)
         else:
@@ -77,7 +77,7 @@ class HospitalizedToRecovered(ChangeState):
 
     def do(self):
         self.population.change_state(self.idx, 'covid', 'recovered')
-        time = self.population.diseases['covid'].stream.gamma(25, 10)
+        time = self.population.diseases['covid'].stream.buffered('gamma', 25, 10)()
         RecoveredToSusceptible(self.simulator.now() + time,
                                self.simulator, self.idx)
         if self.simulator.verbose:
@@ -94,7 +94,7 @@ class HospitalizedToDeath(ChangeState):
 class PresymptomaticToAsymptomatic(ChangeState):
 
     def do(self):
-        time =self.population.diseases['covid'].stream.exponential(2)
+        time =self.population.diseases['covid'].stream.buffered('exponential', 2)()
         self.population.change_state(self.idx, 'covid', 'asymptomatic')
         AsymptomaticToRecovered(self.simulator.now() + time,
                                 self.simulator, self.idx)
@@ -105,7 +105,7 @@ class SymptomaticToRecovered(ChangeState):
 
     def do(self):
         self.population.change_state(self.idx, 'covid', 'recovered')
-        time = self.population.diseases['covid'].stream.gamma(25, 10)
+        time = self.population.diseases['covid'].stream.buffered('gamma', 25, 10)()
         RecoveredToSusceptible(self.simulator.now() + time,
                                self.simulator, self.idx)
         if self.simulator.verbose:
@@ -115,7 +115,7 @@ class AsymptomaticToRecovered(ChangeState):
 
     def do(self):
         self.population.change_state(self.idx, 'covid', 'recovered')
-        time = self.population.diseases['covid'].stream.gamma(25, 10)
+        time = self.population.diseases['covid'].stream.buffered('gamma', 25, 10)()
         RecoveredToSusceptible(self.simulator.now() + time,
                                self.simulator, self.idx)
         if self.simulator.verbose:
@@ -143,7 +143,7 @@ class ImportCases(Event):
             susceptibles, size=self.cases, replace=False)
         self.population.change_state(idx, 'covid', 'symptomatic')
         for person in idx:
-            time = self.population.diseases['covid'].stream.exponential(5)
+            time = self.population.diseases['covid'].stream.buffered('exponential', 5)()
             SymptomaticToRecovered(self.simulator.now() + time,
                                    self.simulator, person)
             if self.simulator.verbose:
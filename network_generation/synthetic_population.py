@@ -1,18 +1,121 @@
 import sys
 sys.path.append('./')
 from typing import List, Union
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import igraph as ig
-from itertools import combinations
 import os
+import warnings
 
-def random_combinations(iterable, r, random_state, n):
-    "Random selection from itertools.combinations(iterable, r)"
-    pool = tuple(iterable)
-    k = len(pool)
-    indices = [sorted(tup) for tup in random_state.choice(list(range(k)), (n,r))]
-    return tuple([(pool[i], pool[j]) for i,j in indices])
+def group_members(labels):
+    """ Groups positions by label. Missing labels are left out.
+
+    Returns:
+        (numpy.Array, numpy.Array): positions sorted by group, and size of
+                                    each group.
+    """
+    codes, _ = pd.factorize(pd.Series(labels), sort=True)
+    codes = np.asarray(codes)
+    members = np.flatnonzero(codes >= 0)
+    members = members[np.argsort(codes[members], kind='stable')]
+    sizes = np.bincount(codes[members], minlength=codes.max() + 1) \
+        if len(members) > 0 else np.empty(0, dtype=int)
+    return members, sizes
+
+
+def sample_distinct(totals, counts, random_state):
+    """ Draws counts[g] distinct integers in [0, totals[g]) for each group g.
+    Dense groups are sampled by sorting random keys, and sparse groups by
+    drawing with replacement and dropping repeated values.
+
+    Returns:
+        (numpy.Array, numpy.Array): group and value of each draw.
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    counts = np.minimum(np.asarray(counts, dtype=np.int64), totals)
+    dense = 2*counts > totals
+    # Dense groups: first counts[g] values of a random order of the group
+    groups = np.repeat(np.flatnonzero(dense), totals[dense])
+    starts = np.cumsum(totals[dense]) - totals[dense]
+    values = np.arange(len(groups)) - np.repeat(starts, totals[dense])
+    order = np.lexsort((random_state.random_sample(len(groups)), groups))
+    rank = np.arange(len(order)) - np.repeat(starts, totals[dense])
+    keep = order[rank < counts[groups[order]]]
+    out_groups, out_values = [groups[keep]], [values[keep]]
+    # Sparse groups: rejection of repeated values
+    offsets = np.cumsum(totals) - totals
+    keys = np.empty(0, dtype=np.int64)
+    need = np.where(dense, 0, counts)
+    while need.sum() > 0:
+        groups = np.repeat(np.arange(len(totals)), need)
+        values = (random_state.random_sample(len(groups)) *
+                  totals[groups]).astype(np.int64)
+        keys = np.unique(np.concatenate([keys, offsets[groups] + values]))
+        found = np.bincount(np.searchsorted(offsets, keys, side='right') - 1,
+                            minlength=len(totals))
+        need = np.where(dense, 0, counts - found)
+    key_groups = np.searchsorted(offsets, keys, side='right') - 1
+    out_groups.append(key_groups)
+    out_values.append(keys - offsets[key_groups])
+    return np.concatenate(out_groups), np.concatenate(out_values)
+
+
+def pair_from_code(codes):
+    """ Maps codes in [0, k(k-1)/2) to pairs (i, j) with i < j < k.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    j = ((1 + np.sqrt(1 + 8*codes.astype(float)))/2).astype(np.int64)
+    j -= j*(j - 1)//2 > codes
+    j += (j + 1)*j//2 <= codes
+    return codes - j*(j - 1)//2, j
+
+
+def clique_edges(members, sizes):
+    """ Connects all members of each group.
+
+    Returns:
+        numpy.Array: int32 edges of shape (E, 2).
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    n_pairs = sizes*(sizes - 1)//2
+    groups = np.repeat(np.arange(len(sizes)), n_pairs)
+    codes = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs,
+                                                 n_pairs)
+    i, j = pair_from_code(codes)
+    start = np.cumsum(sizes) - sizes
+    return np.column_stack([members[start[groups] + i],
+                            members[start[groups] + j]]).astype(np.int32)
+
+
+def random_pair_edges(members, sizes, n_pairs, random_state):
+    """ Connects n_pairs[g] distinct random pairs of members of each group
+    g, without self-loops.
+
+    Returns:
+        numpy.Array: int32 edges of shape (E, 2).
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    groups, codes = sample_distinct(sizes*(sizes - 1)//2, n_pairs,
+                                    random_state)
+    i, j = pair_from_code(codes)
+    start = np.cumsum(sizes) - sizes
+    return np.column_stack([members[start[groups] + i],
+                            members[start[groups] + j]]).astype(np.int32)
+
+
+def edges_graph(population, edges):
+    """ Builds a graph with a vertex per agent from an array of edges,
+    dropping repeated edges.
+    """
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    keys = np.unique(edges[:, 0]*len(population) + edges[:, 1])
+    edges = np.column_stack([keys // len(population),
+                             keys % len(population)]).astype(np.int32)
+    # igraph converts python lists faster than numpy arrays
+    G = ig.Graph(n=len(population), edges=edges.tolist())
+    G.vs['idx'] = population['idx'].values
+    return G
 
 # Step 1: population creation.
 #   create population from distribution. Needs bracket distribution per age group.
@@ -83,15 +186,151 @@ def synthetic_population(population_distribution, size, seed,
     
     # Save
     path = os.path.join(save_dir, '{}_n{}_seed{}'.format(name, size, seed))
+    save_population(path, population, {'households': households_graph,
+                                       'schools': schools_graph,
+                                       'workplaces': workplaces_graph,
+                                       'community': community_graph})
+
+def save_population(path, population, graphs):
     os.mkdir(path)
-    wd = os.getcwd()
-    os.chdir(path)
-    population.to_csv('population.csv')
-    households_graph.write_graphml('households')
-    schools_graph.write_graphml('schools')
-    workplaces_graph.write_graphml('workplaces')
-    community_graph.write_graphml('community')
-    os.chdir(wd)
+    population.to_csv(os.path.join(path, 'population.csv'))
+    for label, graph in graphs.items():
+        graph.write_graphml(os.path.join(path, label))
+
+REGION_FILES = ['population_distribution', 'household_size_distribution',
+                'household_age_composition_by_size',
+                'school_size_distribution', 'workplace_distribution']
+
+def synthetic_population_by_region(regions, seed,
+                                   household_size_distribution,
+                                   household_age_composition_by_size,
+                                   school_size_distribution,
+                                   students_per_teacher,
+                                   workplace_distribution,
+                                   p, name, save_dir,
+                                   p_between=None, processes=None):
+    """ Generates a synthetic population split in geographic chunks (i.e.
+    counties or tracts), each one with its own distribution files. Chunks
+    are generated in a process pool, each one with an independent random
+    state spawned from the master seed, so the output does not depend on
+    the number of processes. Chunks are merged with index offsets, so
+    households, schools and workplaces never span two chunks, and the
+    community layer is stitched with random edges between chunks.
+
+    Args:
+        regions (str or pandas.DataFrame): table (or path to a csv file)
+            with a row per chunk and columns 'region', 'size' and
+            'population_distribution'. Columns named after the other
+            distribution arguments override them for the chunks where they
+            are given.
+        seed (int): master seed.
+        p (float): probability of a community contact within a chunk.
+        p_between (float, optional): probability of a community contact
+            between people of different chunks. Defaults to p, which makes
+            the community layer a G(n, p) graph of the whole population.
+        processes (int, optional): number of worker processes. If 1, chunks
+            are generated in the current process. Defaults to the number of
+            CPUs.
+
+    Returns:
+        str: path to the generated population.
+    """
+    if not isinstance(regions, pd.DataFrame):
+        regions = pd.read_csv(regions)
+    defaults = {'household_size_distribution': household_size_distribution,
+                'household_age_composition_by_size':
+                    household_age_composition_by_size,
+                'school_size_distribution': school_size_distribution,
+                'workplace_distribution': workplace_distribution}
+    seeds = np.random.SeedSequence(seed).spawn(len(regions) + 1)
+    args = []
+    for (_, row), seed_sequence in zip(regions.iterrows(), seeds):
+        files = {key: row[key] if key in row and not pd.isna(row[key])
+                 else defaults.get(key) for key in REGION_FILES}
+        args.append((row['region'], int(row['size']), seed_sequence, files,
+                     students_per_teacher, p))
+    if processes == 1:
+        chunks = [generate_region(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunks = list(executor.map(generate_region, *zip(*args)))
+
+    population, edges = merge_regions(chunks)
+    random_state = np.random.RandomState(np.random.MT19937(seeds[-1]))
+    edges['community'].append(cross_community_edges(
+        [len(chunk) for chunk, _ in chunks],
+        p if p_between is None else p_between, random_state))
+
+    path = os.path.join(save_dir, '{}_n{}_seed{}'.format(
+        name, len(population), seed))
+    save_population(path, population, {
+        label: edges_graph(population, np.concatenate(layer))
+        for label, layer in edges.items()})
+    return path
+
+def generate_region(region, size, seed_sequence, files,
+                    students_per_teacher, p):
+    """ Generates the population and the edges of each layer of a chunk.
+    Edges are returned as arrays of local positions, which are cheaper to
+    send between processes than graphs.
+
+    Returns:
+        (pandas.DataFrame, dict): population, and edges by layer.
+    """
+    random_state = np.random.RandomState(np.random.MT19937(seed_sequence))
+    population = create_population(files['population_distribution'],
+                                   size=size, random_state=random_state)
+    population = add_households(
+        population,
+        size_distribution=files['household_size_distribution'],
+        age_composition_by_size=files['household_age_composition_by_size'],
+        random_state=random_state
+        )
+    population = add_schools(
+        population,
+        size_distribution=files['school_size_distribution'],
+        students_per_teacher=students_per_teacher,
+        random_state=random_state
+        )
+    population = add_workplaces(
+        population,
+        distribution=files['workplace_distribution'],
+        random_state=random_state
+        )
+    population['region'] = region
+    edges = {'households': households_edges(population),
+             'schools': schools_edges(population, random_state),
+             'workplaces': workplaces_edges(population, random_state),
+             'community': community_edges(size, p, random_state)}
+    return population, edges
+
+def merge_regions(chunks):
+    """ Concatenates the populations and edges of chunks. Positions, idx and
+    household and school numbers of each chunk are offset by those of the
+    previous chunks.
+
+    Returns:
+        (pandas.DataFrame, dict): population, and lists of edge arrays by
+                                  layer.
+    """
+    populations, edges = [], {}
+    offset, households, schools = 0, 0, 0
+    for population, layers in chunks:
+        population = population.copy()
+        household = population['household'].astype('Int64')
+        school = population['school'].astype('Int64')
+        population['household'] = household + households
+        population['school'] = school + schools
+        households += int(household.max()) + 1 if household.notna().any() \
+            else 0
+        schools += int(school.max()) + 1 if school.notna().any() else 0
+        for label, layer in layers.items():
+            edges.setdefault(label, []).append(layer + offset)
+        populations.append(population)
+        offset += len(population)
+    population = pd.concat(populations, ignore_index=True)
+    population['idx'] = population.index.values
+    return population, edges
 
 def create_population(distribution: str,
                       size: int,
@@ -122,39 +361,88 @@ def add_households(population: pd.DataFrame,
     # Open files
     size_distribution = pd.read_csv(size_distribution)
     composition = pd.read_csv(age_composition_by_size)
-    population['household'] = pd.NA
+    n = len(population)
 
     # Map age in years to household age groups
-    temp_pop = population.copy()
     age_groups = composition.columns.drop('size')
     bins = [int(g.split('-')[0]) for g in age_groups]
     bins.append(int(age_groups[-1].split('-')[1]) + 1)
-    temp_pop['age_group'] = pd.cut(temp_pop['age'].values,
-                                   bins=bins,
-                                   include_lowest=True, right=False,
-                                   labels=age_groups)
-    
-    # Map probabilities by size of household per age group
-    for _,row in composition.iterrows():
-        temp_pop[str(int(row['size']))] = temp_pop['age_group'].map(row.to_dict())
-    
-    # Sample households first with their size, and then
-    # assign people in the population based on weights.
-    household_id = 0
-    while len(temp_pop) > 0:
-        household_size = size_distribution.sample(n=1,
-                                                  weights='proportion',
-                                                  random_state=random_state
-                                                  )['size'].values[0]
-        household = temp_pop.sample(n=min(household_size,
-                                          len(temp_pop)),
-                                    replace=False,
-                                    weights=str(household_size),
-                                    random_state=random_state
-                                    )['idx'].values
-        population.loc[household, 'household'] = household_id
-        household_id += 1
-        temp_pop.drop(household, inplace=True)
+    groups = pd.cut(population['age'].values, bins=bins,
+                    include_lowest=True, right=False, labels=False)
+    groups = np.asarray(groups, dtype=int)
+
+    # Weights of each age group by size of household
+    row_by_size = {int(size): i for i, size in
+                   enumerate(composition['size'].values)}
+    weights = composition[age_groups].values.astype(float)
+
+    # Household sizes are drawn up front until the given people fit, and
+    # the last household is cut to the remaining people
+    size_values = size_distribution['size'].values.astype(int)
+    size_p = size_distribution['proportion'].values.astype(float)
+    size_p = size_p/size_p.sum()
+    remaining = np.bincount(groups, minlength=len(age_groups))
+    placeable = weights[[row_by_size[s] for s in size_values[size_p > 0]]]
+    if (remaining[placeable.sum(axis=0) == 0] > 0).any():
+        raise ValueError('Some age groups have no weight in any household '
+                         'size.')
+
+    def draw_slots(people, first_household):
+        sizes = np.empty(0, dtype=int)
+        while sizes.sum() < people:
+            sizes = np.concatenate([sizes, random_state.choice(
+                size_values, p=size_p,
+                size=int(np.ceil((people - sizes.sum()) /
+                                 (size_p @ size_values))) + 1)])
+        last = np.searchsorted(np.cumsum(sizes), people)
+        sizes = sizes[:last + 1]
+        slots = sizes.copy()
+        slots[-1] -= slots.sum() - people
+        return (first_household + np.repeat(np.arange(len(slots)), slots),
+                weights[np.repeat([row_by_size[s] for s in sizes], slots)])
+
+    # Each slot takes an age group with probability proportional to its
+    # weight times the people of the group not yet placed. Groups keep at
+    # most as many slots as people, and the slots left out draw again.
+    # Slots where no group with people left has weight are dropped, closing
+    # their household early, and households are drawn for the people left.
+    slot_household, slot_weights = draw_slots(n, 0)
+    slot_group = np.full(n, -1)
+    pending = np.arange(n)
+    while remaining.sum() > 0:
+        if len(pending) == 0:
+            households, extra_weights = draw_slots(remaining.sum(),
+                                                   slot_household[-1] + 1)
+            pending = len(slot_group) + np.arange(len(households))
+            slot_household = np.concatenate([slot_household, households])
+            slot_weights = np.concatenate([slot_weights, extra_weights])
+            slot_group = np.concatenate([slot_group,
+                                         np.full(len(households), -1)])
+        w = slot_weights[pending]*remaining
+        pending, w = pending[w.sum(axis=1) > 0], w[w.sum(axis=1) > 0]
+        cdf = np.cumsum(w, axis=1)
+        u = random_state.random_sample(len(pending))*cdf[:, -1]
+        choice = (u[:, None] >= cdf).sum(axis=1)
+        order = np.lexsort((random_state.random_sample(len(pending)),
+                            choice))
+        start = np.searchsorted(choice[order], np.arange(len(age_groups)))
+        rank = np.arange(len(order)) - start[choice[order]]
+        accepted = np.zeros(len(pending), dtype=bool)
+        accepted[order] = rank < remaining[choice[order]]
+        slot_group[pending[accepted]] = choice[accepted]
+        remaining -= np.bincount(choice[accepted],
+                                 minlength=len(age_groups))
+        pending = pending[~accepted]
+    filled = slot_group >= 0
+    slot_group = slot_group[filled]
+    _, slot_household = np.unique(slot_household[filled],
+                                  return_inverse=True)
+
+    # Fill the slots of each age group with its people in random order
+    people = np.lexsort((random_state.random_sample(n), groups))
+    population['household'] = pd.NA
+    population.loc[population.index[people], 'household'] = \
+        slot_household[np.argsort(slot_group, kind='stable')]
     return population
 
 def add_schools(population: pd.DataFrame,
@@ -167,39 +455,51 @@ def add_schools(population: pd.DataFrame,
                   np.random.RandomState = np.random.RandomState(32561)
                   ):
 
-    size_distribution = pd.read_csv(size_distribution)
-    students = population[population['age'].between(*schooling_age)].copy()
-    candidate_teachers = population[population['age'].between(*teaching_age)].copy()
+    size_distribution = pd.read_csv(size_distribution).dropna(
+        subset=['size', 'proportion'])
+    students = population.index.values[
+        population['age'].between(*schooling_age).values]
+    candidate_teachers = population.index.values[
+        population['age'].between(*teaching_age).values]
 
     population['school'] = pd.NA
     population['workplace'] = pd.NA
 
-    school_id = 0
-    while len(students) > 0:
-        school_size_range = size_distribution.sample(n=1,
-                                                     weights='proportion',
-                                                     random_state=random_state,
-                                                     )['size'].values[0]
-        school_size_range = tuple(map(int, school_size_range.split('-')))
-        school_size = min(random_state.randint(*school_size_range), len(students))
-        school = students.sample(n=school_size,
-                                 replace=False,
-                                 random_state=random_state
-                                 )['idx'].values
-        try:
-            teachers = candidate_teachers.sample(
-                n=int(np.ceil(school_size/students_per_teacher)),
-                replace=False,
-                random_state=random_state
-                )['idx'].values
-            population.loc[teachers, 'workplace'] = 'schools'
-            population.loc[teachers, 'school'] = school_id
-            candidate_teachers.drop(teachers, inplace=True)
-        except Exception:
-            pass
-        population.loc[school, 'school'] = school_id
-        school_id += 1
-        students.drop(school, inplace=True)
+    # Draw all school sizes up front until every student fits, and cut the
+    # last school to the remaining students
+    ranges = np.array([tuple(map(int, r.split('-')))
+                       for r in size_distribution['size'].values])
+    p = size_distribution['proportion'].values.astype(float)
+    p = p/p.sum()
+    sizes = np.empty(0, dtype=int)
+    while sizes.sum() < len(students):
+        n = int(np.ceil((len(students) - sizes.sum()) /
+                        max(p @ ranges.mean(axis=1) - 0.5, 1))) + 1
+        drawn = ranges[random_state.choice(len(ranges), size=n, p=p)]
+        sizes = np.concatenate([sizes, random_state.randint(drawn[:, 0],
+                                                            drawn[:, 1])])
+    if len(students) > 0:
+        last = np.searchsorted(np.cumsum(sizes), len(students))
+        sizes = sizes[:last + 1]
+        sizes[-1] -= sizes.sum() - len(students)
+
+    # Split permuted students into schools by cumulative sizes
+    students = random_state.permutation(students)
+    population.loc[students, 'school'] = np.repeat(np.arange(len(sizes)),
+                                                   sizes)
+
+    # Assign teachers in bulk, keeping the ratio of each school
+    needed = np.ceil(sizes/students_per_teacher).astype(int)
+    available = np.searchsorted(np.cumsum(needed), len(candidate_teachers),
+                                side='right')
+    if available < len(sizes):
+        warnings.warn('Not enough teachers: {} of {} schools have '
+                      'teachers.'.format(available, len(sizes)))
+    needed = needed[:available]
+    teachers = random_state.permutation(candidate_teachers)[:needed.sum()]
+    population.loc[teachers, 'workplace'] = 'schools'
+    population.loc[teachers, 'school'] = np.repeat(np.arange(available),
+                                                   needed)
     return population
 
 def add_workplaces(population: pd.DataFrame,
@@ -233,12 +533,12 @@ def add_workplaces(population: pd.DataFrame,
 # a column to groupby, and an algorithm to generate connections.
 
 def create_households_graph(population):
+    return edges_graph(population, households_edges(population))
+
+def households_edges(population):
     assert 'household' in population.columns
-    edges = pd.DataFrame(
-        [(i,j) for _,df in population.groupby('household') for i,j in combinations(df['idx'].values, 2)], columns=['source', 'target'])
-    G = ig.Graph.DataFrame(edges=edges, vertices=pd.DataFrame(population['idx']),
-                           directed=False)
-    return G
+    members, sizes = group_members(population['household'].values)
+    return clique_edges(members, sizes)
 
 def create_schools_graph(population,
                          random_state,
@@ -246,56 +546,102 @@ def create_schools_graph(population,
                          avg_contacts_students=4,
                          avg_contacts_teachers_with_students=10,
                          age_groups=[(5,8), (9,12), (13,18)]):
+    return edges_graph(population, schools_edges(
+        population, random_state, contact_matrix, avg_contacts_students,
+        avg_contacts_teachers_with_students, age_groups))
+
+def schools_edges(population,
+                  random_state,
+                  contact_matrix=None,
+                  avg_contacts_students=4,
+                  avg_contacts_teachers_with_students=10,
+                  age_groups=[(5,8), (9,12), (13,18)]):
     # TO DO: classes logic implementation
     assert 'school' in population.columns
-    edges = []
-
-    for _,dfs in population.groupby('school'):
-        students = dfs[(dfs['age'] < 19) & (~dfs['school'].isna())]['idx'].values
-        teachers = dfs[(dfs['age'] >= 19) & (~dfs['school'].isna())]['idx'].values
-        edges.append(random_combinations(students, r=2, random_state=random_state,
-                            n=int(np.ceil(len(students/avg_contacts_students)))))
-        for t in teachers:
-            edges.append(
-                [sorted((t, s)) for s in random_state.choice(
-                    students, size=min(len(students), avg_contacts_teachers_with_students),
-                                       replace=False)]
-                    )
-
-    edges = pd.DataFrame(
-        [(i, j) for l in edges for i,j in l], columns=['source', 'target'])
-    G = ig.Graph.DataFrame(edges=edges, vertices=pd.DataFrame(population['idx']),
-                           directed=False)
-    return G
+    school = population['school'].values
+    is_student = (population['age'].values < 19) & ~pd.isna(school)
+    is_teacher = (population['age'].values >= 19) & ~pd.isna(school)
+
+    # As many random pairs of students as students in each school
+    students, sizes = group_members(np.where(is_student, school, None))
+    student_edges = random_pair_edges(students, sizes, sizes, random_state)
+
+    # Each teacher meets distinct students of its school
+    _, labels = pd.factorize(pd.Series(np.where(is_student, school, None)),
+                             sort=True)
+    teachers = np.flatnonzero(is_teacher)
+    teacher_school = labels.get_indexer(school[teachers])
+    teachers = teachers[teacher_school >= 0]
+    teacher_school = teacher_school[teacher_school >= 0]
+    owners, picks = sample_distinct(
+        sizes[teacher_school],
+        np.full(len(teachers), avg_contacts_teachers_with_students),
+        random_state)
+    start = np.cumsum(sizes) - sizes
+    teacher_edges = np.column_stack([
+        teachers[owners], students[start[teacher_school[owners]] + picks]])
+
+    return np.concatenate([student_edges,
+                           teacher_edges.astype(np.int32)])
 
 def create_workplaces_graph(population,
                          random_state,
                          contact_matrix=None,
                          avg_contacts=6):
-    # TO DO: classes logic implementation
-    assert 'workplace' in population.columns
-    edges = []
-
-    for _,df in population.groupby('workplace'):
-        if _ != 'schools':
-            workers = df['idx'].values
-            edges.append(random_combinations(workers, r=2,
-                                             random_state=random_state,
-                                             n=int(np.ceil(len(workers/avg_contacts)))))
-    edges = pd.DataFrame(
-        [(i, j) for l in edges for i,j in l], columns=['source', 'target'])
-    G = ig.Graph.DataFrame(edges=edges, vertices=pd.DataFrame(population['idx']),
-                           directed=False)
-    return G
+    return edges_graph(population, workplaces_edges(
+        population, random_state, contact_matrix, avg_contacts))
     # U.S. Bureau of Labor Statistics in
     # their Quarterly Census of Employment and Wages for the fourth quarter of 2019
 
+def workplaces_edges(population,
+                     random_state,
+                     contact_matrix=None,
+                     avg_contacts=6):
+    # TO DO: classes logic implementation
+    assert 'workplace' in population.columns
+    workplace = population['workplace'].values
+    workers, sizes = group_members(
+        np.where((pd.Series(workplace) == 'schools').values, None, workplace))
+    # As many random pairs of workers as workers in each workplace
+    return random_pair_edges(workers, sizes, sizes, random_state)
+
 def create_community_graph(population, p,
                            random_seed=2334):
     import random
     random.seed(random_seed)
     return ig.Graph.Erdos_Renyi(n=len(population), p=p)
 
+def community_edges(size, p, random_state):
+    """ Draws the edges of an Erdos-Renyi graph G(size, p): the number of
+    edges is binomial, and the edges are distinct pairs.
+
+    Returns:
+        numpy.Array: int32 edges of shape (E, 2).
+    """
+    total = size*(size - 1)//2
+    n_edges = random_state.binomial(total, p) if total > 0 else 0
+    _, codes = sample_distinct([total], [n_edges], random_state)
+    i, j = pair_from_code(codes)
+    return np.column_stack([i, j]).astype(np.int32)
+
+def cross_community_edges(sizes, p, random_state):
+    """ Draws the edges between chunks of a G(sum(sizes), p) graph whose
+    vertices are split in consecutive chunks: each pair of chunks is
+    connected by a binomial number of distinct pairs of their members.
+
+    Returns:
+        numpy.Array: int32 edges of shape (E, 2), in global positions.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    starts = np.cumsum(sizes) - sizes
+    a, b = np.triu_indices(len(sizes), k=1)
+    totals = sizes[a]*sizes[b]
+    n_edges = random_state.binomial(totals, p)
+    pairs, codes = sample_distinct(totals, n_edges, random_state)
+    return np.column_stack([
+        starts[a[pairs]] + codes // sizes[b[pairs]],
+        starts[b[pairs]] + codes % sizes[b[pairs]]]).astype(np.int32)
+
 
 # %%
 '''
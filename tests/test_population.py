@@ -0,0 +1,74 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'examples', 'case-study'))
+
+import epydemia as epy
+from covid import Covid
+from step import DailyStep
+
+STATES = ['susceptible', 'exposed', 'infected', 'recovered']
+
+
+def create_sim(size=500, attributes={}):
+    sim = epy.AgentBasedSim(DailyStep)
+    sim.create_population(how='basic', population_size=size)
+    sim.add_layer('community', how='erdos_renyi', p=0.01)
+    for key, values in attributes.items():
+        sim.population.add_attribute(key, values)
+    sim.add_disease(Covid, disease_kwargs={'infection_prob': 0.1,
+                                           'initial_cases': 0,
+                                           'states': STATES})
+    return sim
+
+
+def test_change_state_empty_idx():
+    population = create_sim().population
+    before = population['covid'].copy()
+    population.change_state([], 'covid', 'infected')
+    population.change_state(np.array([], dtype=int), 'covid', 'infected')
+    assert (population['covid'] == before).all()
+    assert len(population.transitions) == 0
+
+
+def test_change_state_repeated_idx():
+    population = create_sim().population
+    population.change_state([7, 7], 'covid', 'infected')
+    counts = population.state_counts('covid', [population.diseases[
+        'covid'].simulator.now()])[0]
+    assert counts.tolist() == [499, 0, 1, 0]
+    assert (counts == np.bincount(population['covid'], minlength=4)).all()
+
+
+def test_stratified_counts_repeated_idx():
+    groups = np.array(['a', 'b'])[np.arange(500) % 2]
+    population = create_sim(attributes={'group': groups}).population
+    population.add_stratifier('group', 'covid')
+    population.change_state([7, 7, 8, 8, 8], 'covid', 'infected')
+    labels, counts = population.stratified_counts('group', 'covid')
+    assert (counts.sum(axis=0) ==
+            np.bincount(population['covid'], minlength=4)).all()
+    for label, row in zip(labels, counts):
+        mask = groups == label if label is not None else \
+            np.zeros(len(groups), dtype=bool)
+        assert (row == np.bincount(population['covid'][mask],
+                                   minlength=4)).all()
+
+
+def test_remove_agents_string_attribute():
+    workplace = pd.Series(['health', 'industry', None, 'health'] * 25,
+                          dtype=object).values
+    age_group = np.array(['0-5', '6-10', '11-45', '6-10'] * 25)
+    population = create_sim(100, {'workplace': workplace,
+                                  'age_group': age_group,
+                                  'age': np.arange(100)}).population
+    population.remove_agents([0, 1])
+    slots = population.add_agents(3)
+    assert 0 not in set(population['workplace'].tolist())
+    assert set(population['age_group']) == {'0-5', '6-10', '11-45', ''}
+    assert population['age'][slots].tolist() == [0, 0, 0]
+    assert pd.isna(population['workplace'][slots]).all()